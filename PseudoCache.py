@@ -0,0 +1,147 @@
+import sqlite3
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from PseudoSalt import salt_fingerprint
+
+DEFAULT_CACHE_SIZE = 250000
+DEFAULT_STORE = 'pseudo_digests.sqlite'
+
+
+def factorise(strings):
+    return pd.factorize(np.asarray(strings, dtype=object))
+
+
+class DigestCache:
+    """
+    Bounded LRU of digests keyed by (salt fingerprint, value), shared by every
+    file pseudonymised in a session. Within a batch the values are factorised
+    first, so each distinct value is looked up or hashed once and the digests
+    are broadcast back to the rows.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rows = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        digest = self.entries.get(key)
+        if digest is not None:
+            self.entries.move_to_end(key)
+        return digest
+
+    def put(self, key, digest):
+        self.entries[key] = digest
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def digests(self, strings, salt, hasher):
+        """
+        strings must already be the text pseudo() would hash; hasher is called
+        once with the list of distinct values that are not in the cache.
+        """
+        self.rows += len(strings)
+        codes, uniques = factorise(strings)
+        fingerprint = salt_fingerprint(salt)
+        unique_digests = np.empty(len(uniques), dtype=object)
+        missing = []
+        for i, value in enumerate(uniques):
+            digest = self.get((fingerprint, value))
+            if digest is None:
+                missing.append(i)
+            else:
+                unique_digests[i] = digest
+        self.hits += len(uniques) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            hashed = hasher([uniques[i] for i in missing])
+            for i, digest in zip(missing, hashed):
+                unique_digests[i] = digest
+                if self.max_size:
+                    self.put((fingerprint, uniques[i]), digest)
+        return unique_digests[codes]
+
+    def stats(self):
+        return {'cache_rows': self.rows, 'cache_hits': self.hits, 'cache_misses': self.misses,
+                'cache_evictions': self.evictions, 'cache_size': len(self.entries)}
+
+
+class DigestStore:
+    """
+    Persistent value -> digest table in SQLite for re-runs over the same cohort.
+    The table belongs to one salt: opening it with a different salt empties it,
+    so digests from an old cert are never served. The table holds identifiers
+    in the clear and needs the same protection as the source files.
+    """
+
+    def __init__(self, path, salt):
+        self.path = path
+        self.fingerprint = salt_fingerprint(salt)
+        self.hits = 0
+        self.misses = 0
+        self.known = None
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        # lets the batch mode's worker processes read while one of them appends
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS digests '
+                                    '(value TEXT PRIMARY KEY, digest TEXT NOT NULL) WITHOUT ROWID')
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'salt_fingerprint'").fetchone()
+            if row is None or row[0] != self.fingerprint:
+                self.connection.execute('DELETE FROM digests')
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('salt_fingerprint', ?)",
+                                        (self.fingerprint,))
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def bulk_load(self):
+        return dict(self.connection.execute('SELECT value, digest FROM digests'))
+
+    def bulk_append(self, values, digests):
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO digests VALUES (?, ?)', zip(values, digests))
+
+    def digests(self, strings, hasher):
+        """
+        The table is bulk loaded once per connection; after that every file is
+        served from memory and only new values are hashed and bulk appended.
+        """
+        if self.known is None:
+            self.known = self.bulk_load()
+        codes, uniques = factorise(strings)
+        unique_digests = np.empty(len(uniques), dtype=object)
+        missing = []
+        for i, value in enumerate(uniques):
+            digest = self.known.get(value)
+            if digest is None:
+                missing.append(i)
+            else:
+                unique_digests[i] = digest
+        self.hits += len(uniques) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            values = [uniques[i] for i in missing]
+            hashed = hasher(values)
+            self.bulk_append(values, hashed)
+            for i, value, digest in zip(missing, values, hashed):
+                unique_digests[i] = digest
+                self.known[value] = digest
+        return unique_digests[codes]
+
+    def stats(self):
+        return {'store_hits': self.hits, 'store_misses': self.misses}
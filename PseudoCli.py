@@ -0,0 +1,359 @@
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+import multiprocessing
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PseudoFormats import FORMATS, EXCEL_WRITERS, DEFAULT_EXCEL_WRITER, get_format
+from PseudoCache import DigestCache, DigestStore, DEFAULT_CACHE_SIZE, DEFAULT_STORE
+from PseudoSchema import load_aliases
+from PseudoManifest import MANIFEST_SUFFIX, CHECKPOINT_SUFFIX
+from PseudoMapping import MappingTable, MAPPING_FORMATS, MAPPING_EXTENSIONS, mapping_name
+from PseudoSalt import cert_salt
+from PseudoEngine import Pseudonymiser, Hasher, HASH_MODES, HASH_ALGORITHMS, DIGEST_ENCODINGS, output_name, \
+    PARTIAL_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# files written beside outputs: mappings hold identifiers in the clear, .tmp files are half written,
+# manifests and checkpoints describe a run
+SIDECAR_SUFFIXES = tuple(MAPPING_EXTENSIONS.values()) + ('.tmp', MANIFEST_SUFFIX, CHECKPOINT_SUFFIX)
+
+# one digest cache and store connection per worker process, reused by every file that process handles
+worker_cache = None
+worker_store = None
+
+
+def setup_logging(filename):
+    handler = RotatingFileHandler(filename, maxBytes=10 * 1024 * 1024, backupCount=5)
+    formatter = logging.Formatter('%(asctime)s %(name)-12s %(levelname)-8s %(message)s')
+    handler.setFormatter(formatter)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+
+
+def init_worker(queue):
+    """
+    Sends a worker process's log records, JSON metrics included, back to the
+    parent through queue: only the parent writes the rotating log, and spawned
+    workers would otherwise have no handler at all.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(queue))
+    root.setLevel(logging.DEBUG)
+
+
+def is_data_file(path):
+    if os.path.basename(path).lower().endswith(SIDECAR_SUFFIXES):
+        return False
+    base, extension = os.path.splitext(path)
+    supported = any(extension.lower() in fmt.extensions for fmt in FORMATS)
+    # <name>_psuedo.partial.csv is the output of a run that was interrupted
+    return supported and not base.endswith(('_psuedo', '_psuedo' + PARTIAL_SUFFIX))
+
+
+def expand_inputs(inputs):
+    """
+    Expands directories (one level) and glob patterns the shell left alone
+    into a sorted list of supported files, skipping earlier _psuedo outputs,
+    partial outputs of interrupted runs and the files written beside them.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        elif glob.has_magic(item):
+            candidates = glob.glob(item)
+        else:
+            candidates = [item]
+        paths.extend(path for path in candidates if os.path.isfile(path) and is_data_file(path))
+    return sorted(set(paths))
+
+
+def output_path_for(path, output_dir):
+    if not output_dir:
+        return None
+    return os.path.join(output_dir, os.path.basename(output_name(path)))
+
+
+def get_worker_cache(size):
+    global worker_cache
+    if size and worker_cache is None:
+        worker_cache = DigestCache(size)
+    return worker_cache
+
+
+def get_worker_store(path, salt):
+    global worker_store
+    if path and worker_store is None:
+        worker_store = DigestStore(path, salt)
+    return worker_store
+
+
+def profile_prefix(path, profile_dir):
+    if not profile_dir:
+        return None
+    return os.path.join(profile_dir, os.path.basename(path))
+
+
+def sheet_mapping(values, all_sheets, columns):
+    """
+    --sheet NAME or --sheet NAME=col,col into the sheets argument of
+    Pseudonymiser; a sheet without its own columns uses --column.
+    """
+    if all_sheets:
+        return 'all'
+    if not values:
+        return None
+    mapping = {}
+    for value in values:
+        name, separator, names = value.partition('=')
+        mapping[name] = [column.strip() for column in names.split(',')] if separator else columns
+    return mapping
+
+
+def alias_mapping(path, values):
+    """
+    --aliases FILE and any --alias HEADER=COLUMN on top of it, or None.
+    """
+    aliases = load_aliases(path) if path else {}
+    for value in values or ():
+        header, separator, column = value.partition('=')
+        if not separator or not header or not column:
+            raise ValueError('--alias takes HEADER=COLUMN, not {}'.format(value))
+        aliases[header] = column
+    return aliases or None
+
+
+def run_file(salt, path, options):
+    hasher = Hasher(salt, options['hash_mode'], options['algorithm'], options['digest_size'], options['encoding'])
+    # csv, tsv and parquet inputs in the same run have no sheets to choose
+    fmt = get_format(path, options['format'])
+    sheets = options['sheets'] if fmt.multi_sheet else None
+    output_path = output_path_for(path, options['output_dir']) or output_name(path)
+    mapping = mapping_name(output_path, options['mapping']) if options['mapping'] else None
+    pseudonymiser = Pseudonymiser(salt, path, options['columns'],
+                                  output_path=output_path,
+                                  workers=options['workers'], streaming=options['stream'], fmt=options['format'],
+                                  cache=get_worker_cache(options['cache_size']),
+                                  store=get_worker_store(options['store'], hasher.scope),
+                                  profile=profile_prefix(path, options['profile_dir']),
+                                  passthrough=options['passthrough'], hasher=hasher, sheets=sheets,
+                                  incremental=options['incremental'] and fmt.appendable,
+                                  excel_writer=options['excel_writer'], aliases=options['aliases'],
+                                  mapping=mapping, resume=options['resume'] and fmt.resumable)
+    return pseudonymiser.run()
+
+
+def run_command(args):
+    try:
+        salt = cert_salt(args.cert)
+        Hasher(salt, args.hash_mode, args.algorithm, args.digest_size, args.encoding)
+        aliases = alias_mapping(args.aliases, args.alias)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print('No supported input files found', file=sys.stderr)
+        return 2
+    for directory in (args.output_dir, args.profile):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    columns = args.column or ['identifier']
+    options = {'columns': columns, 'output_dir': args.output_dir, 'workers': args.workers,
+               'stream': args.stream, 'format': args.format, 'cache_size': args.cache_size,
+               'store': args.store, 'profile_dir': args.profile,
+               'passthrough': args.passthrough, 'hash_mode': args.hash_mode, 'algorithm': args.algorithm,
+               'digest_size': args.digest_size, 'encoding': args.encoding,
+               'sheets': sheet_mapping(args.sheet, args.all_sheets, columns), 'incremental': args.incremental,
+               'excel_writer': args.excel_writer, 'aliases': aliases,
+               'mapping': args.mapping, 'resume': args.resume}
+
+    started = time.perf_counter()
+    failures = 0
+    total_rows = 0
+    queue = multiprocessing.Queue()
+    listener = QueueListener(queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker, initargs=(queue,)) as executor:
+            futures = {executor.submit(run_file, salt, path, options): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as error:
+                    failures += 1
+                    logger.error('Failed to pseudonymise %s: %s', path, error)
+                    print('FAILED {}: {}'.format(path, error), file=sys.stderr)
+                    continue
+                total_rows += stats['rows']
+                logger.info('Completing Pseudo: %s', path)
+                print('ok     {} {} rows {:.2f}s ({:,.0f} rows/sec) -> {}'.format(
+                    path, stats['rows'], stats['seconds'], stats['rows_per_sec'] or 0, stats['output']))
+                print('       ' + ' '.join('{} {:.2f}s'.format(name, value) for name, value in stats['phases'].items()))
+                if 'incremental' in stats:
+                    print('       {incremental}, output has {output_rows} rows'.format(**stats))
+                if 'sheets' in stats:
+                    print('       sheets ' + ', '.join('{} {} rows'.format(name, rows) for name, rows in stats['sheets'].items()))
+                if 'resumed_rows' in stats:
+                    print('       resumed after {resumed_rows} rows'.format(**stats))
+                if 'mapping' in stats:
+                    print('       mapping {mapping_rows} values -> {mapping}'.format(**stats))
+                if 'cache_hits' in stats:
+                    print('       digest cache {cache_hits} hits {cache_misses} misses'.format(**stats))
+                if 'store_hits' in stats:
+                    print('       digest store {store_hits} hits {store_misses} misses'.format(**stats))
+    finally:
+        listener.stop()
+
+    print('{} files, {} failed, {} rows in {:.2f}s'.format(
+        len(paths), failures, total_rows, time.perf_counter() - started))
+    return 1 if failures else 0
+
+
+def read_digests(args):
+    digests = list(args.digests)
+    if args.file:
+        with (sys.stdin if args.file == '-' else open(args.file)) as f:
+            digests.extend(line.strip() for line in f if line.strip())
+    return digests
+
+
+def lookup_command(args):
+    """
+    Prints each digest with the value it came from, tab separated, and an
+    empty value for digests the mapping does not hold. Raw digests are given
+    in hex.
+    """
+    table = MappingTable.open(args.mapping)
+    digests = read_digests(args)
+    query = [bytes.fromhex(d) for d in digests] if table.settings.get('digest_encoding') == 'raw' else digests
+    values = table.values(query)
+    for digest, value in zip(digests, values):
+        print('{}\t{}'.format(digest, '' if value is None else value))
+    missing = sum(value is None for value in values)
+    logger.info('Looked up %s digests in %s, %s not found', len(digests), args.mapping, missing)
+    return 1 if missing else 0
+
+
+def named_salts(values):
+    """
+    --cert [NAME=]PATH values as {name: salt}; an unnamed cert is named after
+    its file. The first is the one requests get when they name no salt.
+    """
+    salts = {}
+    for value in values:
+        name, separator, path = value.partition('=')
+        if not separator or os.path.isfile(value):
+            name, path = os.path.splitext(os.path.basename(value))[0], value
+        salts[name] = cert_salt(path)
+    return salts
+
+
+def serve_command(args):
+    from PseudoService import PseudoService, serve
+    try:
+        service = PseudoService(named_salts(args.cert), workers=args.workers, roots=args.root,
+                                output_roots=args.output_root)
+        serve(service, args.host, args.port, args.socket, allow_remote=args.allow_remote,
+              ready=lambda server: print('listening on {}'.format(
+                  args.socket or 'http://{}:{}'.format(*server.server_address[:2])), flush=True))
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Simple Pseudonymiser batch mode")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run = commands.add_parser('run', help="pseudonymise files and directories of files")
+    run.add_argument('inputs', nargs='+', help="files, directories or glob patterns")
+    run.add_argument('--cert', required=True, help="cert or pem file used to generate the salt")
+    run.add_argument('--column', action='append',
+                     help="column to pseudonymise after header normalisation, repeat for several (default identifier)")
+    run.add_argument('--aliases', metavar='FILE',
+                     help="JSON file mapping headers to column names, e.g. {\"Patient ID\": \"identifier\"}")
+    run.add_argument('--alias', action='append', metavar='HEADER=COLUMN',
+                     help="map a header to a column name, repeat for several; added to --aliases")
+    run.add_argument('--sheet', action='append', metavar='NAME[=COLUMN,...]',
+                     help="xlsx sheet to pseudonymise, optionally with its own columns; repeat for several")
+    run.add_argument('--all-sheets', action='store_true', help="pseudonymise every sheet of xlsx files")
+    run.add_argument('--incremental', action='store_true',
+                     help="only hash rows appended since the last run and add them to its output (xlsx, csv, tsv)")
+    run.add_argument('--resume', action='store_true',
+                     help="carry on from the last checkpoint of a run that stopped part way (csv, tsv)")
+    run.add_argument('--excel-writer', choices=sorted(EXCEL_WRITERS), default=DEFAULT_EXCEL_WRITER,
+                     help="xlsx writer backend, xlsxwriter needs the xlsxwriter package (default {})".format(
+                         DEFAULT_EXCEL_WRITER))
+    run.add_argument('--jobs', type=int, default=1, help="files processed at the same time")
+    run.add_argument('--workers', type=int, default=1, help="hashing processes per file")
+    run.add_argument('--stream', action='store_true', help="stream xlsx files row by row")
+    run.add_argument('--passthrough', action='store_true',
+                     help="read only the chosen columns as text and copy the rest with their own types")
+    run.add_argument('--format', choices=[fmt.name for fmt in FORMATS], help="override the extension")
+    run.add_argument('--hash-mode', choices=HASH_MODES, default='legacy',
+                     help="legacy appends the salt to each value, keyed uses it as the BLAKE2 key")
+    run.add_argument('--algorithm', choices=sorted(HASH_ALGORITHMS), default='blake2s', help="keyed mode only")
+    run.add_argument('--digest-size', type=int, help="digest bytes in keyed mode (default the algorithm's largest)")
+    run.add_argument('--encoding', choices=DIGEST_ENCODINGS, default='hex',
+                     help="keyed mode only, raw needs a parquet output")
+    run.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                     help="distinct values kept in each process's digest cache, 0 to disable")
+    run.add_argument('--store', nargs='?', const=DEFAULT_STORE,
+                     help="persistent digest lookup table, emptied when the salt changes (default {})".format(
+                         DEFAULT_STORE))
+    run.add_argument('--mapping', choices=MAPPING_FORMATS,
+                     help="also write a value -> digest table sorted by digest beside each output, for lookup")
+    run.add_argument('--profile', metavar='DIR',
+                     help="write cProfile and tracemalloc dumps for each file into DIR")
+    run.add_argument('--output-dir', help="write outputs here instead of next to the inputs")
+    run.add_argument('--log', default='pseudo_log.log', help="rotating log file")
+    run.set_defaults(func=run_command)
+
+    serve = commands.add_parser('serve', help="keep salts and hashing processes loaded behind a local HTTP service")
+    serve.add_argument('--cert', action='append', required=True, metavar='[NAME=]PATH',
+                       help="cert or pem file to load a salt from, repeat for several; the first is the default")
+    serve.add_argument('--host', default='127.0.0.1', help="address to listen on (default 127.0.0.1)")
+    serve.add_argument('--allow-remote', action='store_true',
+                       help="listen on a --host that is not a loopback address; the service has no authentication")
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--socket', metavar='PATH', help="listen on a Unix socket instead of a port")
+    serve.add_argument('--root', action='append', metavar='DIR',
+                       help="directory POST /file may read from, repeat for several; /file is off without one")
+    serve.add_argument('--output-root', action='append', metavar='DIR',
+                       help="directory POST /file may write outputs and mappings to (default the --root directories)")
+    serve.add_argument('--workers', type=int, help="hashing processes kept warm (default one per CPU)")
+    serve.add_argument('--log', default='pseudo_log.log', help="rotating log file")
+    serve.set_defaults(func=serve_command)
+
+    lookup = commands.add_parser('lookup', help="find the values behind digests in a mapping file")
+    lookup.add_argument('mapping', help="a .mapping.parquet or .mapping.bin file written by run --mapping")
+    lookup.add_argument('digests', nargs='*', help="digests to look up")
+    lookup.add_argument('--file', help="file of digests, one per line, or - for stdin")
+    lookup.add_argument('--log', default='pseudo_log.log', help="rotating log file")
+    lookup.set_defaults(func=lookup_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import base64
+import binascii
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+def value_strings(values):
+    # empty cells from the streaming readers hash as the 'nan' read_excel gives pseudo()
+    return [x if type(x) is str else 'nan' if x is None else str(x) for x in values]
+
+
+def is_text(arrow_type):
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type) or \
+        pa.types.is_string_view(arrow_type)
+
+
+def text_array(values, missing='nan'):
+    """
+    A column as one Arrow large_string array holding the text pseudo() would
+    hash, with missing values as missing (str() of the column's NA value).
+    String columns, pandas 3's Arrow-backed str ones included, are used as
+    they are without a copy; anything else goes through value_strings(), so numbers
+    and dates hash as str(x) always has.
+    """
+    if isinstance(values, pd.Series):
+        if isinstance(values.dtype, pd.StringDtype) and values.dtype.storage == 'pyarrow':
+            missing = str(values.dtype.na_value)
+            values = pa.array(values)
+        else:
+            values = values.to_numpy(dtype=object)
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks() if values.num_chunks != 1 else values.chunk(0)
+    if not isinstance(values, pa.Array) or not is_text(values.type):
+        if isinstance(values, pa.Array):
+            values = values.to_pylist()
+        return pa.array(value_strings(values), pa.large_string())
+    values = values.cast(pa.large_string())
+    return values.fill_null(missing) if values.null_count else values
+
+
+def concat_text(arrays):
+    if not arrays:
+        return pa.array([], pa.large_string())
+    return arrays[0] if len(arrays) == 1 else pa.concat_arrays(arrays)
+
+
+def text_chunks(values, chunks):
+    # each slice copied into buffers of its own, as a pickled slice carries its parent's whole buffer
+    size = -(-len(values) // chunks)
+    return [pa.concat_arrays([values.slice(i, size)]) for i in range(0, len(values), size)]
+
+
+def text_buffers(values):
+    """
+    (data, offsets) of a text array with no nulls: value i is the bytes
+    data[offsets[i]:offsets[i + 1]], already utf-8, so nothing is decoded.
+    """
+    _, offsets, data = values.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64)[values.offset:values.offset + len(values) + 1]
+    return (data.to_pybytes() if data is not None else b''), offsets.tolist()
+
+
+def digest_width(digest_size, encoding):
+    if encoding == 'hex':
+        return digest_size * 2
+    if encoding == 'base64':
+        return -(-digest_size * 4 // 3)
+    return digest_size
+
+
+def encode_digests(raw, digest_size, encoding):
+    """
+    Equal length digests joined into one bytes object, as a fixed width NumPy
+    bytes array in the chosen encoding: hex through one hexlify call, and
+    unpadded urlsafe base64 by zero padding each digest to whole 3 byte
+    groups, which leaves its characters unchanged, and trimming the slots.
+    """
+    if encoding == 'hex':
+        return np.frombuffer(binascii.hexlify(raw), dtype='S{}'.format(digest_size * 2))
+    if encoding == 'raw':
+        return np.frombuffer(raw, dtype='S{}'.format(digest_size))
+    group = -(-digest_size // 3) * 3
+    count = len(raw) // digest_size
+    padded = np.zeros((count, group), dtype=np.uint8)
+    padded[:, :digest_size] = np.frombuffer(raw, dtype=np.uint8).reshape(count, digest_size)
+    text = np.frombuffer(base64.urlsafe_b64encode(padded.tobytes()), dtype='S{}'.format(group // 3 * 4))
+    return text.astype('S{}'.format(digest_width(digest_size, 'base64')))
+
+
+def fixed_digests(digests, width):
+    # str or bytes digests, e.g. from a cache, in the fixed width form
+    return np.asarray(digests, dtype=object).astype('S{}'.format(width))
+
+
+def digest_arrow(digests, arrow_type=pa.large_string()):
+    """
+    Fixed width digests as an Arrow string or binary array over the same
+    bytes, with no Python object per digest. string and binary have 32 bit
+    offsets, so a single array of them stops short of 2GB of digests.
+    """
+    width = digests.dtype.itemsize
+    large = pa.types.is_large_string(arrow_type) or pa.types.is_large_binary(arrow_type)
+    offsets = np.arange(0, (len(digests) + 1) * width, width, dtype=np.int64 if large else np.int32)
+    return pa.Array.from_buffers(arrow_type, len(digests),
+                                 [None, pa.py_buffer(offsets), pa.py_buffer(np.ascontiguousarray(digests))])
+
+
+def digest_series(digests, index=None):
+    # an Arrow-backed text column over the digest buffer, which pandas writes as any other str column
+    return pd.Series(digest_arrow(digests), index=index, dtype='str')
@@ -2,16 +2,13 @@
 from tkinter import ttk
 import tkinter as tk
 import tkinter.filedialog as fd
-import pandas as pd
-import threading
-import hashlib
+import multiprocessing
 import os
-import pandas.io.formats.excel
 import logging
 from logging.handlers import RotatingFileHandler
-import pem
 from functools import partial
-pandas.io.formats.excel.header_style = None
+from PseudoJobs import JobQueue
+from PseudoStartup import warm_up
 
 
 class App(tk.Tk):
@@ -19,7 +16,7 @@ class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.resizable(False, False)
-        self.geometry("500x300")
+        self.geometry("500x350")
         self.title("Simple Pseudonymiser")
         self.welcomeLabel = tk.Label(self, text="Welcome to the Simple Pseudonymiser")
         self.welcomeLabel.pack(padx=60, pady=10)
@@ -39,12 +36,14 @@ class App(tk.Tk):
 
         self._fileName = tk.StringVar()
         self._result = tk.StringVar()
-        self._salt = tk.StringVar()
+        # a plain str, so jobs get the salt itself rather than a Tcl variable
+        self._salt = ""
         self._saltOutput = tk.StringVar()
         self._pseudoOutput =tk.StringVar()
 
         self._inputFileName = tk.StringVar()
         self._resultOutput = tk.StringVar()
+        self.digest_cache = None
 
         self._pseudoOutput.set("Pseudonymise the file")
         self.btn_salt = ttk.Button(self, text="Choose a cert/pem file to generate your salt",
@@ -83,6 +82,9 @@ class App(tk.Tk):
 
 
         self.processing_bar = ttk.Progressbar(self, orient='horizontal', mode='determinate', length=300)
+        self.btn_cancel = ttk.Button(self, text="Cancel", command=self.cancel_jobs, width=100)
+        self.jobs = JobQueue(self, self.job_event)
+        warm_up(self)
 
     def report_callback_exception(self, exc, val, tb):
         self.logger.error('Error!', val)
@@ -103,37 +105,35 @@ class App(tk.Tk):
 
     def choose_salt_file(self):
         self.btn_file['state'] = 'disabled'
-        self._salt.set("")
+        self._salt = ""
         file_types = (("Text File", "*.txt"),)
         filepath = fd.askopenfilename(title="Open PEM file", filetypes=file_types)
         exists = os.path.isfile(filepath)
         if exists:
-            self._salt.set(filepath)
-            with open(self._salt.get()) as f:
-                self._salt.set(f.readline())
-            self._saltOutput.set("Your salt term is " + self._salt.get()[4:].rjust(len(self._salt.get()), "*"))
+            from PseudoSalt import salts
+            self._salt = salts.file_salt(filepath)
+            self._saltOutput.set("Your salt term is " + self._salt[4:].rjust(len(self._salt), "*"))
             self.btn_file['state'] = 'normal'
             self.logger.info('Salt Loaded')
 
     def choose_pem_file(self):
         self.btn_file['state'] = 'disabled'
-        self._salt.set("")
+        self._salt = ""
         file_types = (("pem file", "*.pem"),("cert file", "*.cert"),("crt file", "*.crt"))
         filepath = fd.askopenfilename(title="Open pem or cert file", filetypes=file_types)
         exists = os.path.isfile(filepath)
         if exists:
-            certs = pem.parse_file(filepath)
-            self._salt.set(filepath)
-            self._salt.set(certs[0].sha1_hexdigest)
-            self._saltOutput.set("Your salt term is " + self._salt.get()[4:].rjust(len(self._salt.get()), "*"))
+            from PseudoSalt import salts
+            self._salt = salts.cert_salt(filepath)
+            self._saltOutput.set("Your salt term is " + self._salt[4:].rjust(len(self._salt), "*"))
             self.btn_file['state'] = 'normal'
             self.logger.info('Salt Loaded')
 
     def choose_file(self):
         self.btn_pseudo['state'] = 'disabled'
         self._fileName.set("")
-        file_types = (("xlsx", "*.xlsx"),)
-        filepath = fd.askopenfilename(title="Open file", filetypes=file_types)
+        from PseudoFormats import data_file_types
+        filepath = fd.askopenfilename(title="Open file", filetypes=data_file_types())
         exists = os.path.isfile(filepath)
         if exists:
             self._fileName.set(filepath)
@@ -145,8 +145,9 @@ class App(tk.Tk):
             temp_name = self.get_file_display_name(self._fileName.get())
 
             # self._pseudoOutput.set("Pseudonymise the column "+self.om_variable.get())
-            first_row = pd.read_excel(self._fileName.get(), dtype='str', encoding='utf-8', nrows=1)
-            self.options = list(first_row)
+            from PseudoEngine import column_names
+            from PseudoSchema import lower_headers
+            self.options = column_names(self._fileName.get(), header_normaliser=lower_headers)
             self.update_option_menu()
             self.om['state'] = 'normal'
             self.om_variable.set(self.options[0])
@@ -167,20 +168,44 @@ class App(tk.Tk):
 
 
 
-    def pseudo(self, x):
-        sentence = str(x) + self._salt.get()
-        return str(hashlib.blake2s(sentence.encode('utf-8')).hexdigest())
-
     def pseudonymize_file(self):
-        self.logger.info('Starting Pseudo: ' + self._fileName.get())
+        path = self._fileName.get()
+        salt = self._salt
+        column = self.om_variable.get()
+        cache = self.get_digest_cache()
+        self.logger.info('Starting Pseudo: ' + path)
+
+        def run(progress, cancel):
+            from PseudoEngine import Pseudonymiser
+            from PseudoSchema import lower_headers
+            pseudonymiser = Pseudonymiser(salt, path, column, header_normaliser=lower_headers,
+                                          progress=progress, cancel=cancel, workers=None,
+                                          cache=cache)
+            return pseudonymiser.run()
+
+        self.jobs.submit(path, run)
+        self.btn_pseudo['state'] = 'disabled'
         self.processing_bar.pack(padx=60, pady=10)
-        self.processing_bar.start(1000)
-        t = threading.Thread(target=self.pseudonymize_file_callback)
-        t.start()
+        self.btn_cancel.pack(padx=60, pady=10)
+        if self.jobs.busy() and self.jobs.pending():
+            self.resultLabel.config(style="foreOrange.Label")
+            self._resultOutput.set(self.get_file_display_name(path) + " has been queued, "
+                                   + str(self.jobs.pending()) + " waiting")
+
+    def get_digest_cache(self):
+        if self.digest_cache is None:
+            from PseudoCache import DigestCache
+            self.digest_cache = DigestCache()
+        return self.digest_cache
+
+    def cancel_jobs(self):
+        self.jobs.cancel()
+        self._resultOutput.set("Cancelling...")
 
     def kill_progress(self):
         self.processing_bar.stop()
         self.processing_bar.pack_forget()
+        self.btn_cancel.pack_forget()
 
     def get_extension(self, filename):
         filename, file_extension = os.path.splitext(filename)
@@ -190,67 +215,51 @@ class App(tk.Tk):
         temp_name = os.path.basename(filename);
         return temp_name[:15] + ('..' + self.get_extension(temp_name) if len(temp_name) > 15 else '')
 
-    def pseudonymize_file_callback(self):
-        try:
-            self.btn_pseudo['state'] = 'disabled'
-            self.btn_file['state'] = 'disabled'
-            self.btn_salt['state'] = 'disabled'
-            temp_name = self.get_file_display_name(self._fileName.get())
-
-            self.resultLabel.config(style="foreOrange.Label")
-            self._resultOutput.set(temp_name + " is being loaded")
-            self.update()
-
-            df = pd.read_excel(self._fileName.get(), dtype='str', encoding='utf-8')
-            df.columns = df.columns.str.lower()
-            #if 'identifier' not in df.columns:
-            #    self.resultLabel.config(style="foreRed.Label")
-            #    self._resultOutput.set("No 'identifier' column exists in file!")
-            #    self.btn_pseudo['state'] = 'normal'
-            #    self.btn_file['state'] = 'normal'
-            #    self.btn_salt['state'] = 'normal'
-            #    self.kill_progress()
-
-            #else:
-            temp_name = str(self._fileName.get())
-            temp_name = temp_name.replace(".xlsx", "_psuedo.xlsx")
-            new_name = temp_name
-            self.btn_pseudo['state'] = 'disabled'
+    def show_progress(self, rows, total):
+        if total:
+            if str(self.processing_bar['mode']) != 'determinate':
+                self.processing_bar.stop()
+                self.processing_bar.config(mode='determinate')
+            self.processing_bar.config(maximum=total, value=min(rows, total))
+        elif str(self.processing_bar['mode']) != 'indeterminate':
+            self.processing_bar.config(mode='indeterminate')
+            self.processing_bar.start(50)
+
+    def job_event(self, event):
+        path = event['path']
+        temp_name = self.get_file_display_name(path) if path else ''
+        waiting = " (" + str(self.jobs.pending()) + " waiting)" if self.jobs.pending() else ""
+        if event['type'] == 'started':
             self.resultLabel.config(style="foreOrange.Label")
-            temp_name = self.get_file_display_name(self._fileName.get())
-            self._resultOutput.set(temp_name + " is being pseudonymised")
+            self._resultOutput.set(temp_name + " is being loaded" + waiting)
+            self.processing_bar.config(value=0)
             self.config(cursor="wait")
-            self.update()
-
-            #df['DIGEST'] = df.identifier.apply(self.pseudo)
-            #del df['identifier']
-
-            df['DIGEST'] = df[self.om_variable.get()].apply(self.pseudo)
-            del df[self.om_variable.get()]
-
-            self._result.set(os.path.basename(temp_name))
-            if os.path.exists(new_name):
-                os.remove(new_name)
-            df.to_excel(new_name, index=False)
-            self._resultOutput.set(os.path.basename(str(self._fileName.get())) + " has been pseudonymised")
+        elif event['type'] == 'progress':
+            self.show_progress(event['rows'], event['total'])
+            if event['phase'] == 'pseudonymising':
+                counts = str(event['rows']) + (" of " + str(event['total']) if event['total'] else "")
+                self._resultOutput.set(temp_name + " is being pseudonymised, " + counts + " rows" + waiting)
+            elif event['phase'] == 'writing':
+                self._resultOutput.set(temp_name + " is being saved" + waiting)
+        elif event['type'] == 'done':
+            self._result.set(os.path.basename(event['stats']['output']))
+            self._resultOutput.set(os.path.basename(str(path)) + " has been pseudonymised" + waiting)
             self.resultLabel.config(style="foreGreen.Label")
-            self.btn_pseudo['state'] = 'disabled'
-            self.btn_file['state'] = 'normal'
-            self.btn_salt['state'] = 'normal'
-            self.config(cursor="")
-            self.logger.info('Completing Pseudo: ' + self._fileName.get())
-            self.kill_progress()
-
-        except BaseException as error:
+            self.logger.info('Completing Pseudo: ' + path)
+        elif event['type'] == 'cancelled':
+            self.resultLabel.config(style="foreRed.Label")
+            self._resultOutput.set(temp_name + " was cancelled")
+            self.logger.info('Cancelled Pseudo: ' + path)
+        elif event['type'] == 'failed':
             self.resultLabel.config(style="foreRed.Label")
             self._resultOutput.set('An exception occurred: details in log file')
-            self.btn_pseudo['state'] = 'normal'
-            self.btn_file['state'] = 'normal'
-            self.btn_salt['state'] = 'normal'
-            self.logger.error('An exception occurred: {}'.format(error))
+            self.logger.error('An exception occurred: {}'.format(event['error']))
+        elif event['type'] == 'idle':
+            self.config(cursor="")
             self.kill_progress()
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = App()
     app.mainloop()
@@ -0,0 +1,703 @@
+import os
+import time
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from PseudoFormats import get_format, EXCEL_WRITERS, DEFAULT_EXCEL_WRITER
+from PseudoProbe import cached_headers
+from PseudoSalt import salts, salt_fingerprint
+from PseudoSchema import normalise_headers, header_schema
+from PseudoMetrics import RunMetrics, log_record, profiled, file_size
+from PseudoManifest import load_manifest, save_manifest, remove_manifest, load_checkpoint, save_checkpoint, \
+    remove_checkpoint
+from PseudoMapping import MappingCollector, MappingTable, write_mapping
+from PseudoColumns import value_strings, text_array, concat_text, text_chunks, text_buffers, digest_width, \
+    encode_digests, fixed_digests, digest_series
+
+logger = logging.getLogger(__name__)
+
+PARALLEL_MIN_ROWS = 100000
+HASH_BLOCK_ROWS = 250000
+# digests are gathered this many at a time before being encoded into the fixed width buffer
+HASH_SLICE_ROWS = 4096
+CHECKPOINT_SECONDS = 30
+PARTIAL_SUFFIX = '.partial'
+HASH_MODES = ('legacy', 'keyed')
+HASH_ALGORITHMS = {'blake2b': hashlib.blake2b, 'blake2s': hashlib.blake2s}
+DIGEST_ENCODINGS = ('hex', 'base64', 'raw')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class MissingColumnError(KeyError):
+
+    def __str__(self):
+        return "No '{}' column exists in file".format(self.args[0])
+
+
+def output_name(filename):
+    base, extension = os.path.splitext(str(filename))
+    return base + "_psuedo" + extension
+
+
+def partial_name(output_path):
+    # keeps the extension, which some writers pick their format from
+    base, extension = os.path.splitext(str(output_path))
+    return base + PARTIAL_SUFFIX + extension
+
+
+def column_names(path, header_normaliser=normalise_headers, fmt=None, aliases=None):
+    return header_schema(header_normaliser, aliases).names(cached_headers(get_format(path, fmt), path))
+
+
+def pseudo(x, salt):
+    sentence = str(x) + salt
+    return str(hashlib.blake2s(sentence.encode('utf-8')).hexdigest())
+
+
+def encode_values(values):
+    strings = value_strings(values)
+    # one encode call for the whole column, unless a value holds the separator
+    encoded = '\x00'.join(strings).encode('utf-8').split(b'\x00')
+    if len(encoded) != len(strings):
+        encoded = [x.encode('utf-8') for x in strings]
+    return encoded
+
+
+def pseudo_batch(values, salt):
+    """
+    Same digests as pseudo() for a whole column: the salt is encoded once and
+    every value is hashed from a copy of one prepared blake2s state.
+    """
+    salt_bytes = str(salt).encode('utf-8')
+    base = hashlib.blake2s()
+    encoded = encode_values(values)
+    digests = np.empty(len(encoded), dtype=object)
+    for i, value in enumerate(encoded):
+        state = base.copy()
+        state.update(value)
+        state.update(salt_bytes)
+        digests[i] = state.hexdigest()
+    return digests
+
+
+def chunk_values(values, chunks):
+    size = -(-len(values) // chunks)
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def base64_digests(raw, digest_size):
+    # unpadded urlsafe base64 of equal length digests in one b64encode call
+    return encode_digests(b''.join(raw), digest_size, 'base64').astype(str).astype(object)
+
+
+class Hasher:
+    """
+    How values become digests. legacy is str(x)+salt through unkeyed blake2s
+    as 64 hex characters, the output every earlier file has. keyed passes the
+    salt as the BLAKE2 key instead of appending it to the value, and lets the
+    algorithm, digest_size (bytes) and encoding be chosen: a 16 byte digest
+    is 32 hex or 22 base64 characters. raw keeps the digest bytes, which only
+    formats with a binary column type can write.
+    """
+
+    def __init__(self, salt, mode='legacy', algorithm='blake2s', digest_size=None, encoding='hex'):
+        if mode not in HASH_MODES:
+            raise ValueError('Unknown hash mode {}'.format(mode))
+        if algorithm not in HASH_ALGORITHMS:
+            raise ValueError('Unknown hash algorithm {}'.format(algorithm))
+        if encoding not in DIGEST_ENCODINGS:
+            raise ValueError('Unknown digest encoding {}'.format(encoding))
+        max_size = HASH_ALGORITHMS[algorithm].MAX_DIGEST_SIZE
+        digest_size = digest_size if digest_size else max_size
+        if not 1 <= digest_size <= max_size:
+            raise ValueError('{} digests are 1 to {} bytes'.format(algorithm, max_size))
+        if mode == 'legacy' and (algorithm, digest_size, encoding) != ('blake2s', 32, 'hex'):
+            raise ValueError('legacy mode is always 32 byte blake2s in hex')
+        self.salt = str(salt)
+        self.mode = mode
+        self.algorithm = algorithm
+        self.digest_size = digest_size
+        self.encoding = encoding
+        # derived once, and cached for the session, so each batch gets the key as bytes
+        self.key = salts.key(self.salt, algorithm) if mode == 'keyed' else None
+
+    @property
+    def binary(self):
+        return self.encoding == 'raw'
+
+    @property
+    def width(self):
+        # bytes per digest in the encoding, the itemsize of fixed_batch() arrays
+        return digest_width(self.digest_size, self.encoding)
+
+    @property
+    def scope(self):
+        # what cached and stored digests are keyed by: the salt alone for legacy,
+        # so existing stores stay valid, and the salt plus settings otherwise
+        if self.mode == 'legacy':
+            return self.salt
+        return '\x00'.join([self.salt, self.mode, self.algorithm, str(self.digest_size), self.encoding])
+
+    def settings(self):
+        return {'hash_mode': self.mode, 'hash_algorithm': self.algorithm,
+                'digest_size': self.digest_size, 'digest_encoding': self.encoding}
+
+    def pseudo(self, x):
+        if self.mode == 'legacy':
+            return pseudo(x, self.salt)
+        return self.batch([x])[0]
+
+    def batch(self, values):
+        """
+        Digests for a whole column, each hashed from a copy of one keyed state
+        so the key block is only compressed once.
+        """
+        if self.mode == 'legacy':
+            return pseudo_batch(values, self.salt)
+        algorithm = HASH_ALGORITHMS[self.algorithm]
+        base = algorithm(key=self.key, digest_size=self.digest_size)
+        finish = algorithm.hexdigest if self.encoding == 'hex' else algorithm.digest
+        encoded = encode_values(values)
+        digests = np.empty(len(encoded), dtype=object)
+        for i, value in enumerate(encoded):
+            state = base.copy()
+            state.update(value)
+            digests[i] = finish(state)
+        if self.encoding == 'base64' and len(digests):
+            return base64_digests(digests, self.digest_size)
+        return digests
+
+    def fixed_batch(self, values):
+        """
+        The same digests as batch() in a fixed width NumPy bytes array (S64 for
+        legacy hex) allocated up front, hashed straight from the utf-8 bytes of
+        an Arrow text array (see text_array), so neither the values nor the
+        digests become a Python object per row.
+        """
+        data, offsets = text_buffers(text_array(values))
+        rows = len(offsets) - 1
+        digests = np.empty(rows, dtype='S{}'.format(self.width))
+        if self.mode == 'legacy':
+            base, tail = hashlib.blake2s(), self.salt.encode('utf-8')
+        else:
+            base, tail = HASH_ALGORITHMS[self.algorithm](key=self.key, digest_size=self.digest_size), b''
+        for start in range(0, rows, HASH_SLICE_ROWS):
+            stop = min(start + HASH_SLICE_ROWS, rows)
+            raw = []
+            for begin, end in zip(offsets[start:stop], offsets[start + 1:stop + 1]):
+                state = base.copy()
+                state.update(data[begin:end])
+                state.update(tail)
+                raw.append(state.digest())
+            digests[start:stop] = encode_digests(b''.join(raw), self.digest_size, self.encoding)
+        return digests
+
+
+def pseudo_parallel(values, salt, workers=None, chunks=None, executor=None, fixed=False):
+    """
+    pseudo_batch() split over a process pool. Chunks come back through
+    Executor.map in submission order, so the digests line up with the rows.
+    salt may also be a Hasher, whose batch() is used instead. executor is an
+    already running pool of workers processes to use instead of starting one.
+    fixed hashes an Arrow text array with fixed_batch() instead.
+    """
+    hasher = salt if isinstance(salt, Hasher) else Hasher(salt)
+    batch = hasher.fixed_batch if fixed else hasher.batch
+    workers = workers if workers else os.cpu_count() or 1
+    if workers <= 1 or len(values) < PARALLEL_MIN_ROWS:
+        return batch(values)
+    # a few chunks per worker keeps the pool busy when some chunks hash slower
+    chunks = chunks if chunks else workers * 4
+    parts = text_chunks(values, chunks) if fixed else chunk_values(list(values), chunks)
+    if executor is not None:
+        return np.concatenate(list(executor.map(batch, parts)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        digests = list(executor.map(batch, parts))
+    return np.concatenate(digests)
+
+
+class Pseudonymiser:
+    """
+    Pseudonymises one or more columns of an excel, csv, tsv or parquet file
+    without any Tk state, so it can be driven from the dialogs, from batch
+    scripts or from a benchmark. The file format comes from the extension
+    unless fmt is given. A single column becomes DIGEST as it always has;
+    several columns become DIGEST_<column> each, all in one load and save.
+    Passing a DigestCache hashes each distinct value once and reuses digests
+    across the files that share the cache. Passing a DigestStore for the same
+    salt looks digests up from earlier runs and only hashes new values.
+    Each run logs a JSON metrics record with per-phase timings; profile names
+    a file prefix for cProfile and tracemalloc dumps. passthrough reads only
+    the chosen columns as text and copies every other column with its own
+    type (Arrow buffers for csv and parquet, cell types for xlsx).
+
+    progress is called as progress(phase, rows_done, rows_total) after each
+    hashed block, with rows_total None when the format cannot tell in advance.
+    Setting the cancel event stops the run at the next block with JobCancelled
+    and removes any partial output.
+
+    hasher picks the digest scheme (see Hasher); without one the legacy
+    str(x)+salt blake2s digests are written.
+
+    sheets picks the xlsx sheets to pseudonymise into one output workbook:
+    'all', a list of sheet names hashing columns in each, or a dict of sheet
+    name to its own column list. Left as None only the first sheet is read.
+
+    incremental keeps a manifest beside the output and, when the rows the
+    last run processed are unchanged, hashes only the rows appended since
+    and adds them to the existing output; otherwise the output is rebuilt.
+
+    excel_writer picks how xlsx output is written: 'openpyxl' write_only and
+    'xlsxwriter' constant_memory write rows with no cell styling at all,
+    'pandas' is DataFrame.to_excel as earlier releases wrote it.
+
+    mapping names a sidecar file (.parquet, or anything else for the binary
+    format, see PseudoMapping) written with each distinct value and its digest,
+    sorted by digest for reverse lookup with MappingTable. It is gathered from
+    the blocks as they are hashed, not by reading the file again.
+
+    executor is a running process pool for hashing (with workers its size),
+    so a long lived caller such as the service does not start one per file.
+    Without one, each run starts a single pool of workers processes (one per
+    CPU when workers is None) that every block and chunk of the run hashes
+    on, and shuts it down when the run ends.
+
+    Output is written to a .partial file beside the output and renamed over
+    it when complete, so a failed run leaves the earlier output as it was.
+    csv and tsv runs also save a checkpoint every checkpoint_seconds; after a
+    crash, resume=True cuts the partial file back to the last checkpoint and
+    carries on from the chunk after it. The chunks before it are parsed again
+    to find where it starts, but not hashed or written.
+
+    aliases maps headers to column names, e.g. {'Patient ID': 'identifier'},
+    applied after header_normaliser (see HeaderSchema). Headers that collide
+    on a column being pseudonymised raise HeaderCollisionError.
+    """
+
+    def __init__(self, salt, input_path, columns='identifier', output_path=None,
+                 header_normaliser=normalise_headers, progress=None, workers=1, streaming=False, fmt=None,
+                 cache=None, store=None, profile=None, passthrough=False, cancel=None, hasher=None,
+                 sheets=None, incremental=False, excel_writer=DEFAULT_EXCEL_WRITER, aliases=None,
+                 mapping=None, resume=False, checkpoint_seconds=CHECKPOINT_SECONDS, executor=None):
+        self.salt = str(salt)
+        self.hasher = hasher if hasher is not None else Hasher(self.salt)
+        self.input_path = str(input_path)
+        self.columns = [columns] if isinstance(columns, str) else list(columns)
+        self.output_path = output_path if output_path else output_name(self.input_path)
+        self.header_normaliser = header_normaliser
+        self.aliases = dict(aliases) if aliases else None
+        self.schema = header_schema(header_normaliser, self.aliases)
+        self.progress = progress
+        self.workers = workers
+        self.executor = executor
+        self.streaming = streaming
+        self.format = get_format(self.input_path, fmt)
+        if self.hasher.binary and not self.format.binary_digests:
+            raise ValueError('{} files cannot hold raw digests, use hex or base64'.format(self.format.name))
+        if sheets is not None and not self.format.multi_sheet:
+            raise ValueError('{} files have no sheets to choose'.format(self.format.name))
+        if incremental and not self.format.appendable:
+            raise ValueError('{} files cannot be appended to, run them in full'.format(self.format.name))
+        self.cache = cache
+        if store is not None and store.fingerprint != salt_fingerprint(self.hasher.scope):
+            raise ValueError('The digest store {} belongs to a different salt'.format(store.path))
+        self.store = store
+        self.profile = profile
+        self.passthrough = passthrough
+        self.cancel = cancel
+        self.sheets = sheets
+        self.incremental = incremental
+        if excel_writer not in EXCEL_WRITERS:
+            raise ValueError('Unknown excel writer {}'.format(excel_writer))
+        self.excel_writer = excel_writer
+        self.mapping_path = str(mapping) if mapping else None
+        if resume and not self.format.resumable:
+            raise ValueError('{} runs cannot be resumed, run them in full'.format(self.format.name))
+        self.resume = resume
+        self.checkpoint_seconds = checkpoint_seconds
+        self.partial_path = partial_name(self.output_path)
+        self.metrics = RunMetrics()
+        self.rows_done = 0
+        self.rows_total = None
+        self.sheet_rows = None
+        self.delta = None
+        self.output_rows = None
+        self.mapping = None
+        self.manifest = None
+        self.resumed = None
+        self.checkpointed = None
+
+    def report(self, phase):
+        if self.cancel is not None and self.cancel.is_set():
+            raise JobCancelled(self.input_path)
+        if self.progress is not None:
+            self.progress(phase, self.rows_done, self.rows_total)
+
+    def pseudo(self, x):
+        return self.hasher.pseudo(x)
+
+    def timed(self, phase):
+        return self.metrics.phase(phase)
+
+    def timed_iter(self, phase, iterable):
+        return self.metrics.timed_iter(phase, iterable)
+
+    def selected_columns(self):
+        if isinstance(self.sheets, dict):
+            return set(self.columns).union(*[[columns] if isinstance(columns, str) else columns
+                                             for columns in self.sheets.values()])
+        return set(self.columns)
+
+    def normalise(self, headers):
+        with self.timed('headers'):
+            return pd.Index(self.schema.names(headers, self.selected_columns()))
+
+    def digest_names(self, columns=None):
+        columns = self.columns if columns is None else columns
+        if len(columns) == 1:
+            return ['DIGEST']
+        return ['DIGEST_' + column for column in columns]
+
+    def column_indexes(self, headers, columns=None):
+        columns = self.columns if columns is None else columns
+        headers = list(headers)
+        for column in columns:
+            if column not in headers:
+                raise MissingColumnError(column)
+        return [headers.index(column) for column in columns]
+
+    def output_headers(self, headers, columns=None):
+        columns = self.columns if columns is None else columns
+        return [h for h in headers if h not in columns] + self.digest_names(columns)
+
+    def sheet_columns(self, names):
+        """
+        {sheet name: columns} for the sheets this job covers, in workbook order.
+        Sheets that were not chosen are left out of the output with a warning
+        rather than copied, as they may hold identifiers in the clear.
+        """
+        if self.sheets == 'all':
+            return {name: self.columns for name in names}
+        if isinstance(self.sheets, dict):
+            wanted = {sheet: [columns] if isinstance(columns, str) else list(columns)
+                      for sheet, columns in self.sheets.items()}
+        else:
+            wanted = {sheet: self.columns for sheet in ([self.sheets] if isinstance(self.sheets, str)
+                                                         else self.sheets)}
+        unknown = [sheet for sheet in wanted if sheet not in names]
+        if unknown:
+            raise ValueError('No sheet named {} in {}'.format(', '.join(map(repr, unknown)), self.input_path))
+        skipped = [name for name in names if name not in wanted]
+        if skipped:
+            logger.warning('Sheets %s of %s were not chosen and are left out of the output',
+                           ', '.join(map(repr, skipped)), self.input_path)
+        return {name: wanted[name] for name in names if name in wanted}
+
+    def sheet_hash_columns(self, sheet, headers, columns=None):
+        """
+        The columns to hash in one sheet. With sheets='all' a sheet without
+        them, a notes sheet say, is copied through unhashed with a warning;
+        a sheet chosen by name must have the columns it was given.
+        """
+        columns = self.columns if columns is None else columns
+        if self.sheets != 'all':
+            self.column_indexes(headers, columns)
+            return list(columns)
+        present = [column for column in columns if column in list(headers)]
+        if len(present) < len(columns):
+            logger.warning("Sheet '%s' of %s has no %s column, copied without hashing it", sheet,
+                           self.input_path, ', '.join(column for column in columns if column not in present))
+        return present
+
+    def check_sheets_hashed(self, hashed):
+        # copying sheets that lack the columns is fine, a workbook where none has them is a mistake
+        if self.sheets == 'all' and not hashed:
+            raise MissingColumnError(self.columns[0])
+
+    def copy_rows(self, rows):
+        # rows copied through unhashed still count towards progress
+        self.rows_done += rows
+        self.report('pseudonymising')
+
+    def hash_strings(self, strings):
+        if self.store is None:
+            return pseudo_parallel(strings, self.hasher, self.workers, executor=self.executor)
+        return self.store.digests(strings, lambda missing: pseudo_parallel(missing, self.hasher, self.workers,
+                                                                           executor=self.executor))
+
+    def hash_values(self, values):
+        if self.cache is None and self.store is None:
+            return pseudo_parallel(values, self.hasher, self.workers, executor=self.executor)
+        strings = value_strings(values)
+        if self.cache is None:
+            return self.hash_strings(strings)
+        return self.cache.digests(strings, self.hasher.scope, self.hash_strings)
+
+    def hash_fixed(self, values):
+        if self.cache is None and self.store is None:
+            return pseudo_parallel(values, self.hasher, self.workers, executor=self.executor, fixed=True)
+        # the cache and store work on strings, their digests are put back into the fixed width form
+        return fixed_digests(self.hash_values(values.to_pylist()), self.hasher.width)
+
+    def split_digests(self, columns, values, digests):
+        if self.mapping is not None:
+            with self.timed('mapping'):
+                self.mapping.add(values, digests)
+        self.rows_done += len(columns[0]) if columns else 0
+        self.report('pseudonymising')
+        return np.split(digests, np.cumsum([len(column) for column in columns])[:-1])
+
+    def hash_columns(self, columns):
+        """
+        Hashes every selected column in one batch and splits the digests back
+        into one array per column.
+        """
+        with self.timed('hash'):
+            values = [value for column in columns for value in column]
+            digests = self.hash_values(values)
+        return self.split_digests(columns, value_strings(values) if self.mapping is not None else None, digests)
+
+    def hash_arrays(self, columns):
+        """
+        hash_columns() for columnar data, pandas or Arrow columns: the values
+        are hashed from one Arrow text array and each column's digests come
+        back as a fixed width NumPy bytes array.
+        """
+        with self.timed('hash'):
+            values = concat_text([text_array(column) for column in columns])
+            digests = self.hash_fixed(values)
+        return self.split_digests(columns, values, digests)
+
+    def digest_frame(self, df, columns=None):
+        columns = self.columns if columns is None else columns
+        self.column_indexes(df.columns, columns)
+        if not columns:
+            self.copy_rows(len(df))
+            return df
+        sources = [text_array(df[column]) for column in columns]
+        blocks = [self.hash_arrays([source.slice(start, HASH_BLOCK_ROWS) for source in sources])
+                  for start in range(0, max(len(df), 1), HASH_BLOCK_ROWS)]
+        digests = [np.concatenate([block[i] for block in blocks]) for i in range(len(columns))]
+        for column, name, digest in zip(columns, self.digest_names(columns), digests):
+            del df[column]
+            df[name] = digest_series(digest, df.index)
+        return df
+
+    @property
+    def write_path(self):
+        # appends go into the existing output, anything else is written aside and renamed into place
+        return self.output_path if self.delta == 'append' else self.partial_path
+
+    def remove_output(self):
+        if os.path.exists(self.write_path):
+            os.remove(self.write_path)
+
+    def finalise_output(self):
+        """
+        Swaps the finished file in for the output in one rename, so the earlier
+        output stays whole until then, and saves the manifest for it.
+        """
+        if self.delta not in ('append', 'unchanged'):
+            os.replace(self.partial_path, self.output_path)
+        remove_checkpoint(self.output_path)
+        if self.manifest is not None:
+            save_manifest(self.output_path, dict(self.manifest, output_size=file_size(self.output_path)))
+
+    def restart(self, reason):
+        logger.info('Not resuming %s: %s', self.input_path, reason)
+        return None
+
+    def resume_point(self):
+        """
+        The checkpoint of an earlier run that stopped part way, when this run
+        would write exactly the same output and the partial file still holds
+        what the checkpoint recorded; otherwise None and the run starts over.
+        """
+        if not self.resume:
+            return None
+        checkpoint = load_checkpoint(self.output_path)
+        if checkpoint is None:
+            return self.restart('no checkpoint')
+        stat = os.stat(self.input_path)
+        if checkpoint.get('input') != [os.path.abspath(self.input_path), stat.st_mtime_ns, stat.st_size]:
+            return self.restart('the input has changed')
+        if checkpoint.get('settings') != self.manifest_settings():
+            return self.restart('the settings have changed')
+        if self.mapping is not None:
+            return self.restart('a mapping needs every row hashed in one run')
+        if file_size(self.partial_path) < checkpoint['output_bytes']:
+            return self.restart('the partial output is shorter than the checkpoint')
+        logger.info('Resuming %s after chunk %s, %s rows', self.input_path, checkpoint['chunks'], checkpoint['rows'])
+        self.resumed = checkpoint['rows']
+        return checkpoint
+
+    def start_output(self, checkpoint):
+        # a resumed run cuts the partial file back to the last checkpoint, anything else starts it afresh
+        if checkpoint is None:
+            self.remove_output()
+        else:
+            os.truncate(self.partial_path, checkpoint['output_bytes'])
+        self.checkpointed = time.monotonic()
+
+    def checkpoint(self, chunks, rows, output_bytes):
+        """
+        Records the chunks completed so far, at most every checkpoint_seconds,
+        once their rows are in the partial output.
+        """
+        if time.monotonic() - self.checkpointed < self.checkpoint_seconds:
+            return
+        stat = os.stat(self.input_path)
+        save_checkpoint(self.output_path, {'input': [os.path.abspath(self.input_path), stat.st_mtime_ns, stat.st_size],
+                                           'chunks': chunks,
+                                           'rows': rows,
+                                           'output_bytes': output_bytes,
+                                           'salt_fingerprint': salt_fingerprint(self.hasher.scope),
+                                           'settings': self.manifest_settings()})
+        self.checkpointed = time.monotonic()
+
+    def manifest_settings(self):
+        # everything that changes how rows already in the output were written
+        settings = {'format': self.format.name,
+                    'columns': self.columns,
+                    'salt_fingerprint': salt_fingerprint(self.hasher.scope),
+                    'header_normaliser': self.schema.name,
+                    'passthrough': self.passthrough,
+                    'streaming': self.streaming,
+                    'sheets': self.sheets}
+        # only when set, so manifests written before aliases existed stay valid
+        if self.aliases:
+            settings['aliases'] = self.aliases
+        if self.mapping_path:
+            settings['mapping'] = os.path.abspath(self.mapping_path)
+        return settings
+
+    def rebuild(self, reason):
+        logger.info('Rebuilding %s in full: %s', self.input_path, reason)
+        self.delta = 'rebuild'
+        return None
+
+    def previous_manifest(self):
+        """
+        The last run's manifest when its output can be appended to: same input,
+        same settings, and the output exactly as that run left it.
+        """
+        manifest = load_manifest(self.output_path)
+        if manifest is None:
+            return self.rebuild('no manifest')
+        if manifest.get('input') != os.path.abspath(self.input_path):
+            return self.rebuild('the manifest belongs to {}'.format(manifest.get('input')))
+        if manifest.get('settings') != self.manifest_settings():
+            return self.rebuild('the settings have changed')
+        if file_size(self.output_path) != manifest.get('output_size'):
+            return self.rebuild('the output has changed')
+        if self.mapping_path and not os.path.exists(self.mapping_path):
+            return self.rebuild('the mapping is missing')
+        return manifest
+
+    def record_manifest(self, rows, input_size, checksum):
+        # saved by finalise_output once the output it describes is in place
+        self.output_rows = rows
+        self.manifest = {'input': os.path.abspath(self.input_path),
+                         'rows': rows,
+                         'input_size': input_size,
+                         'checksum': checksum,
+                         'settings': self.manifest_settings()}
+
+    def mapping_settings(self):
+        return dict(self.hasher.settings(), salt_fingerprint=salt_fingerprint(self.hasher.scope),
+                    columns=self.columns, input=os.path.abspath(self.input_path))
+
+    def save_mapping(self):
+        """
+        Writes the mapping gathered while hashing. An appending run only saw the
+        new rows, so they are merged into the mapping the earlier run wrote; an
+        unchanged input hashed nothing and leaves that mapping as it is.
+        """
+        with self.timed('mapping'):
+            if self.delta == 'unchanged':
+                return len(MappingTable.open(self.mapping_path))
+            previous = None
+            if self.delta == 'append' and os.path.exists(self.mapping_path):
+                previous = MappingTable.open(self.mapping_path)
+            values, digests = self.mapping.table(previous)
+            del previous
+            write_mapping(self.mapping_path, values, digests, self.hasher.binary, self.mapping_settings())
+        return len(values)
+
+    def pool_size(self):
+        return self.workers if self.workers else os.cpu_count() or 1
+
+    def run(self):
+        if self.executor is not None or self.pool_size() <= 1:
+            return self.run_job()
+        # processes only start once a block is large enough to send to them
+        self.executor = ProcessPoolExecutor(max_workers=self.pool_size())
+        try:
+            return self.run_job()
+        finally:
+            executor, self.executor = self.executor, None
+            executor.shutdown(cancel_futures=True)
+
+    def run_job(self):
+        self.metrics = RunMetrics()
+        self.rows_done = 0
+        self.rows_total = None
+        self.sheet_rows = None
+        self.delta = None
+        self.output_rows = None
+        self.manifest = None
+        self.resumed = None
+        self.mapping = MappingCollector() if self.mapping_path else None
+        try:
+            with profiled(self.profile):
+                if self.incremental:
+                    rows = self.format.pseudonymise_incremental(self)
+                else:
+                    remove_manifest(self.output_path)
+                    rows = self.format.pseudonymise(self)
+                self.finalise_output()
+        except JobCancelled:
+            # a cancelled append leaves the earlier output, which the next run rebuilds
+            if self.delta != 'append':
+                self.remove_output()
+            remove_checkpoint(self.output_path)
+            logger.info('Cancelled Pseudo: %s', self.input_path)
+            raise
+        except Exception:
+            # a resumable run keeps its partial output and checkpoint for resume=True
+            if self.delta != 'append' and not self.format.resumable:
+                self.remove_output()
+            raise
+        stats = {'input': self.input_path,
+                 'output': self.output_path,
+                 'columns': self.columns,
+                 'format': self.format.name,
+                 'rows': rows}
+        if self.sheet_rows is not None:
+            stats['sheets'] = self.sheet_rows
+        if self.delta is not None:
+            stats['incremental'] = self.delta
+            stats['output_rows'] = self.output_rows
+        if self.resumed is not None:
+            stats['resumed_rows'] = self.resumed
+        if self.mapping is not None:
+            stats['mapping'] = self.mapping_path
+            stats['mapping_rows'] = self.save_mapping()
+            self.mapping = None
+        stats.update(self.hasher.settings())
+        stats.update(self.metrics.record(rows, self.input_path, self.output_path))
+        logger.info('Pseudonymised %s rows of %s in %.2fs', stats['rows'], self.input_path, stats['seconds'])
+        if self.cache is not None:
+            stats.update(self.cache.stats())
+            logger.info('Digest cache: %(cache_hits)s hits, %(cache_misses)s misses, %(cache_evictions)s evictions, '
+                        '%(cache_size)s entries over %(cache_rows)s rows', stats)
+        if self.store is not None:
+            stats.update(self.store.stats())
+            logger.info('Digest store: %(store_hits)s hits, %(store_misses)s misses', stats)
+        log_record('pseudonymise', stats)
+        return stats
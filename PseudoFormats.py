@@ -0,0 +1,680 @@
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+import pandas as pd
+import pandas.io.formats.excel
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from PseudoProbe import probe_xlsx_headers, cached_headers, sheet_names, first_sheet_path
+from PseudoManifest import file_checksums, frame_checksums, ends_with_newline
+
+pandas.io.formats.excel.header_style = None
+
+STREAM_BLOCK_ROWS = 10000
+CSV_CHUNK_ROWS = 100000
+ARROW_BLOCK_BYTES = 16 * 1024 * 1024
+ZIP_BLOCK_BYTES = 1024 * 1024
+# rows in an xlsx sheet, the header row included
+XLSX_MAX_ROWS = 1048576
+DIMENSION = re.compile(rb'<dimension ref="([A-Z]+[0-9]+)(?::([A-Z]+)[0-9]+)?"\s*/>')
+
+# read_csv's and read_excel's default missing markers, which they hand to pseudo() as 'nan'
+NA_VALUES = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                       '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+
+
+def na_text(column):
+    """
+    A passthrough text column with read_csv's missing markers as the 'nan'
+    pseudo() is given for them, worked out in Arrow rather than per value.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    return pc.if_else(pc.is_in(column, value_set=pa.array(sorted(NA_VALUES))), 'nan', column)
+
+
+def na_cells(values):
+    # streamed cells that read_excel would read as missing, so both paths hash them alike
+    return ['nan' if type(value) is str and value in NA_VALUES else value for value in values]
+
+
+def sheet_full(title):
+    return ValueError("Sheet '{}' is full: an xlsx sheet holds at most {:,} rows".format(title, XLSX_MAX_ROWS))
+
+
+class OpenpyxlRows:
+    """
+    openpyxl write_only: rows are serialised as they are appended and no cell
+    carries a style, header row included. Strings starting with '=' are
+    written as text, as xlsxwriter writes them, not as formulas.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.book = openpyxl.Workbook(write_only=True)
+
+    def add_sheet(self, title=None):
+        sheet = self.book.create_sheet(title)
+        rows = iter(range(XLSX_MAX_ROWS))
+
+        def text(value):
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.data_type = 's'
+            return cell
+
+        def append(values):
+            if next(rows, None) is None:
+                raise sheet_full(sheet.title)
+            sheet.append([text(value) if type(value) is str and value[:1] == '=' else value for value in values])
+        return append
+
+    def close(self):
+        self.book.save(self.path)
+
+
+class XlsxwriterRows:
+    """
+    xlsxwriter in constant_memory mode: each row is flushed once the next one
+    starts, and no cell carries a style. Strings are always written as text,
+    never turned into formulas, numbers or links.
+    """
+
+    def __init__(self, path):
+        import xlsxwriter
+        self.book = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_formulas': False,
+                                               'strings_to_numbers': False, 'strings_to_urls': False,
+                                               'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+
+    def add_sheet(self, title=None):
+        sheet = self.book.add_worksheet(title)
+        rows = iter(range(XLSX_MAX_ROWS))
+
+        def append(values):
+            row = next(rows, None)
+            if row is None:
+                raise sheet_full(sheet.name)
+            sheet.write_row(row, 0, values)
+        return append
+
+    def close(self):
+        self.book.close()
+
+
+# 'pandas' is DataFrame.to_excel through openpyxl, the writer every release before had
+EXCEL_WRITERS = {'pandas': None, 'openpyxl': OpenpyxlRows, 'xlsxwriter': XlsxwriterRows}
+DEFAULT_EXCEL_WRITER = 'openpyxl'
+
+
+def excel_rows(df):
+    # missing values become empty cells rather than NaN, which neither writer can store
+    values = df.astype(object)
+    return values.where(values.notna(), None).itertuples(index=False, name=None)
+
+
+def write_excel(frames, path, writer=DEFAULT_EXCEL_WRITER):
+    """
+    Writes {sheet name: frame} into one workbook with the chosen backend.
+    """
+    if EXCEL_WRITERS[writer] is None:
+        with pd.ExcelWriter(path, engine='openpyxl') as excel:
+            for title, df in frames.items():
+                df.to_excel(excel, sheet_name=title, index=False)
+        return
+    book = EXCEL_WRITERS[writer](path)
+    for title, df in frames.items():
+        append = book.add_sheet(title)
+        append([str(column) for column in df.columns])
+        for row in excel_rows(df):
+            append(row)
+    book.close()
+
+
+def pseudonymise_frame(fmt, job, read=None, write=None):
+    job.report('loading')
+    with job.timed('read'):
+        df = read(job) if read is not None else fmt.read(job.input_path)
+    df.columns = job.normalise(df.columns)
+    job.rows_total = len(df)
+
+    job.report('pseudonymising')
+    df = job.digest_frame(df)
+
+    job.report('writing')
+    with job.timed('write'):
+        job.remove_output()
+        if write is not None:
+            write(df, job)
+        else:
+            fmt.write(df, job.write_path)
+    rows = len(df)
+    del df
+    return rows
+
+
+def read_sheet(path, sheet, dtype):
+    # module level so sheet reads can run in worker processes
+    return pd.read_excel(path, sheet_name=sheet, dtype=dtype)
+
+
+def sheet_row_xml(number, values):
+    cells = []
+    for column, value in enumerate(values, 1):
+        if value is None or value != value:
+            continue
+        cells.append('<c r="{}{}" t="inlineStr"><is><t xml:space="preserve">{}</t></is></c>'.format(
+            get_column_letter(column), number, escape(str(value))))
+    return '<row r="{}">{}</row>'.format(number, ''.join(cells))
+
+
+def stretch_dimension(xml, last_row):
+    # readers size the sheet from the stored dimension, so it has to cover the new rows
+    def ref(match):
+        first = match.group(1).decode('ascii')
+        last_column = match.group(2).decode('ascii') if match.group(2) else re.match('[A-Z]+', first).group(0)
+        return '<dimension ref="{}:{}{}"/>'.format(first, last_column, last_row).encode('ascii')
+    return DIMENSION.sub(ref, xml, count=1)
+
+
+def splice_rows(xml, rows):
+    end = xml.find(b'</sheetData>')
+    if end >= 0:
+        return xml[:end] + rows + xml[end:], True
+    empty = xml.find(b'<sheetData/>')
+    if empty >= 0:
+        return xml[:empty] + b'<sheetData>' + rows + b'</sheetData>' + xml[empty + len(b'<sheetData/>'):], True
+    return xml, False
+
+
+def append_sheet_rows(path, df, first_row):
+    """
+    Appends the rows of df to the first sheet of an xlsx file as inline
+    string cells. Every other part of the archive is copied as it is and the
+    sheet XML is streamed through with the rows spliced in before
+    </sheetData>, so the rows already there are never parsed or rewritten.
+    """
+    rows = ''.join(sheet_row_xml(first_row + i, values)
+                   for i, values in enumerate(df.itertuples(index=False, name=None))).encode('utf-8')
+    last_row = first_row + len(df) - 1
+    temp = path + '.tmp'
+    try:
+        with zipfile.ZipFile(path) as source, zipfile.ZipFile(temp, 'w', zipfile.ZIP_DEFLATED) as target:
+            sheet_path = first_sheet_path(source)
+            for item in source.infolist():
+                if item.filename != sheet_path:
+                    target.writestr(item, source.read(item.filename))
+                    continue
+                with source.open(item) as reader, target.open(item, 'w', force_zip64=True) as writer:
+                    pending = b''
+                    head = True
+                    spliced = False
+                    for block in iter(lambda: reader.read(ZIP_BLOCK_BYTES), b''):
+                        pending += block
+                        if head:
+                            pending = stretch_dimension(pending, last_row)
+                            head = False
+                        if not spliced:
+                            pending, spliced = splice_rows(pending, rows)
+                        # hold back enough bytes that a closing tag split across blocks is still found
+                        keep = 0 if spliced else len(b'</sheetData>')
+                        writer.write(pending[:len(pending) - keep])
+                        pending = pending[len(pending) - keep:]
+                    writer.write(pending)
+                if not spliced:
+                    raise ValueError('No sheetData in {} of {}'.format(sheet_path, path))
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+class ExcelFormat:
+    name = 'xlsx'
+    binary_digests = False
+    multi_sheet = True
+    appendable = True
+    resumable = False
+    extensions = ('.xlsx',)
+
+    def read_headers(self, path):
+        return probe_xlsx_headers(path)
+
+    def read(self, path):
+        return pd.read_excel(path, dtype='str')
+
+    def write(self, df, path, writer=DEFAULT_EXCEL_WRITER):
+        write_excel({'Sheet1': df}, path, writer)
+
+    def write_job(self, df, job):
+        self.write(df, job.write_path, job.excel_writer)
+
+    def read_passthrough(self, job):
+        # only the chosen columns are read as text, the rest keep their cell types
+        headers = cached_headers(self, job.input_path)
+        text = {raw: 'str' for raw, name in zip(headers, job.normalise(headers)) if name in job.columns}
+        return pd.read_excel(job.input_path, dtype=text)
+
+    def pseudonymise(self, job):
+        if job.streaming:
+            return self.stream(job)
+        if job.sheets is not None:
+            return self.pseudonymise_sheets(job)
+        if job.passthrough:
+            return pseudonymise_frame(self, job, self.read_passthrough, self.write_job)
+        return pseudonymise_frame(self, job, write=self.write_job)
+
+    def pseudonymise_incremental(self, job):
+        """
+        The whole sheet is still read, since every byte of an xlsx changes when
+        rows are added, but when the rows of the last run are unchanged only
+        the rows after them are hashed, and they are spliced into the output
+        sheet rather than writing the workbook again.
+        """
+        if job.streaming or job.passthrough or job.sheets is not None:
+            job.rebuild('incremental xlsx runs only cover the first sheet read as text')
+            return self.pseudonymise(job)
+        job.report('loading')
+        with job.timed('read'):
+            df = self.read(job.input_path)
+        df.columns = job.normalise(df.columns)
+        job.rows_total = len(df)
+        manifest = job.previous_manifest()
+        kept = manifest['rows'] if manifest is not None and manifest['rows'] <= len(df) else 0
+        before, checksum = frame_checksums(df, kept, len(df))
+        if manifest is not None and before != manifest['checksum']:
+            manifest = job.rebuild('rows processed by the last run have changed')
+
+        if manifest is None:
+            rows = pseudonymise_frame(self, job, lambda job: df, self.write_job)
+        elif kept == len(df):
+            job.delta = 'unchanged'
+            rows = 0
+        else:
+            job.delta = 'append'
+            job.rows_done = kept
+            job.report('pseudonymising')
+            tail = job.digest_frame(df.iloc[kept:].copy())
+            job.report('writing')
+            with job.timed('write'):
+                append_sheet_rows(job.write_path, tail, kept + 2)
+            rows = len(tail)
+        job.record_manifest(len(df), None, checksum)
+        return rows
+
+    def sheet_dtype(self, job, sheet, columns):
+        if not job.passthrough:
+            return 'str'
+        headers = probe_xlsx_headers(job.input_path, sheet)
+        return {raw: 'str' for raw, name in zip(headers, job.normalise(headers)) if name in columns}
+
+    def pseudonymise_sheets(self, job):
+        """
+        Parses the chosen sheets on the run's process pool, as parsing is the
+        slow part and every sheet parses on its own, and hashes each sheet here
+        as it arrives so the cache, store, progress and cancel work as they do
+        for one sheet. All the sheets are then written into one workbook.
+        """
+        job.report('loading')
+        sheets = job.sheet_columns(sheet_names(job.input_path))
+        dtypes = [self.sheet_dtype(job, sheet, columns) for sheet, columns in sheets.items()]
+        parallel = job.executor is not None and len(sheets) > 1
+        frames = {}
+        job.sheet_rows = {}
+        hashed = False
+        reads = (job.executor.map if parallel else map)(read_sheet, [job.input_path] * len(sheets), list(sheets),
+                                                        dtypes)
+        for (sheet, columns), df in zip(sheets.items(), job.timed_iter('read', reads)):
+            df.columns = job.normalise(df.columns)
+            # the total grows as sheets arrive, their sizes are unknown until parsed
+            job.rows_total = (job.rows_total or 0) + len(df)
+            job.report('pseudonymising')
+            columns = job.sheet_hash_columns(sheet, df.columns, columns)
+            hashed = hashed or bool(columns)
+            frames[sheet] = job.digest_frame(df, columns)
+            job.sheet_rows[sheet] = len(df)
+        job.check_sheets_hashed(hashed)
+
+        job.report('writing')
+        with job.timed('write'):
+            job.remove_output()
+            write_excel(frames, job.write_path, job.excel_writer)
+        return sum(job.sheet_rows.values())
+
+    def stream_block(self, append, block, indexes, job):
+        if not indexes:
+            with job.timed('write'):
+                for row in block:
+                    append(row)
+            job.copy_rows(len(block))
+            return
+        digests = job.hash_columns([na_cells([row[index] for row in block]) for index in indexes])
+        dropped = set(indexes)
+        with job.timed('write'):
+            for i, row in enumerate(block):
+                kept = tuple(value for index, value in enumerate(row) if index not in dropped)
+                append(kept + tuple(digest[i] for digest in digests))
+
+    def stream_sheet(self, job, worksheet, target, title, columns):
+        rows = job.timed_iter('read', worksheet.iter_rows(values_only=True))
+        header_row = next(rows, ())
+        headers = list(job.normalise(
+            ['Unnamed: {}'.format(i) if h is None else str(h) for i, h in enumerate(header_row)]))
+        columns = job.sheet_hash_columns(title, headers, columns)
+        indexes = job.column_indexes(headers, columns)
+
+        job.report('pseudonymising')
+        append = target.add_sheet(title)
+        append(job.output_headers(headers, columns))
+        count = 0
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) == STREAM_BLOCK_ROWS:
+                self.stream_block(append, block, indexes, job)
+                count += len(block)
+                block = []
+        self.stream_block(append, block, indexes, job)
+        count += len(block)
+        return count, bool(indexes)
+
+    def stream(self, job):
+        """
+        One pass from a read_only workbook into a write_only workbook, so only
+        STREAM_BLOCK_ROWS rows are held in memory whatever the size of the file.
+        Chosen sheets are streamed one after another into the same workbook.
+        The pandas writer has no row interface, so it streams through openpyxl.
+        """
+        job.report('loading')
+        with job.timed('read'):
+            source = openpyxl.load_workbook(job.input_path, read_only=True)
+        try:
+            if job.sheets is None:
+                plan = [(source.worksheets[0], None, None)]
+            else:
+                plan = [(source[name], name, columns)
+                        for name, columns in job.sheet_columns(source.sheetnames).items()]
+            # the stored dimension can be missing or stale, so this is only a guide for progress
+            sizes = [worksheet.max_row for worksheet, title, columns in plan]
+            job.rows_total = sum(size - 1 for size in sizes) if all(sizes) else None
+
+            rows_writer = EXCEL_WRITERS[job.excel_writer] or OpenpyxlRows
+            target = rows_writer(job.write_path)
+            counts = {}
+            hashed = False
+            for worksheet, title, columns in plan:
+                counts[title], sheet_hashed = self.stream_sheet(job, worksheet, target, title, columns)
+                hashed = hashed or sheet_hashed
+            if job.sheets is not None:
+                job.check_sheets_hashed(hashed)
+                job.sheet_rows = counts
+
+            job.report('writing')
+            with job.timed('write'):
+                job.remove_output()
+                target.close()
+        finally:
+            source.close()
+        return sum(counts.values())
+
+
+class CsvFormat:
+    name = 'csv'
+    binary_digests = False
+    multi_sheet = False
+    appendable = True
+    resumable = True
+    extensions = ('.csv',)
+    sep = ','
+
+    def read_headers(self, path):
+        return list(pd.read_csv(path, sep=self.sep, nrows=0, engine='c').columns)
+
+    def read(self, path):
+        return pd.read_csv(path, sep=self.sep, dtype='str', engine='c')
+
+    def write(self, df, path):
+        df.to_csv(path, sep=self.sep, index=False)
+
+    @contextmanager
+    def source(self, job, offset):
+        # the whole file, or an open handle on the rows after offset, which have no header line
+        if offset is None:
+            yield job.input_path
+        else:
+            with open(job.input_path, 'rb') as f:
+                f.seek(offset)
+                yield f
+
+    def pseudonymise(self, job, offset=None):
+        """
+        Reads CSV_CHUNK_ROWS rows at a time with the C parser and appends each
+        pseudonymised chunk to the output, so csv input is always streamed.
+        With an offset only the rows after it are read, and appended to the
+        existing output. A resumed run skips the chunks its checkpoint covers.
+        """
+        if job.passthrough:
+            return self.passthrough(job, offset)
+        job.report('loading')
+        checkpoint = job.resume_point() if offset is None else None
+        names = {} if offset is None else {'header': None, 'names': cached_headers(self, job.input_path)}
+        with self.source(job, offset) as source:
+            chunks = pd.read_csv(source, sep=self.sep, dtype='str', engine='c', chunksize=CSV_CHUNK_ROWS, **names)
+            if offset is None:
+                job.start_output(checkpoint)
+            count = 0
+            headers = None
+            for index, chunk in enumerate(job.timed_iter('read', chunks)):
+                if headers is None:
+                    headers = job.normalise(chunk.columns)
+                    job.report('pseudonymising')
+                if checkpoint is not None and index < checkpoint['chunks']:
+                    count += len(chunk)
+                    job.rows_done = count
+                    continue
+                chunk.columns = headers
+                chunk = job.digest_frame(chunk)
+                with job.timed('write'):
+                    chunk.to_csv(job.write_path, sep=self.sep, index=False, mode='a',
+                                 header=count == 0 and offset is None)
+                count += len(chunk)
+                if offset is None:
+                    job.checkpoint(index + 1, count, os.path.getsize(job.write_path))
+        if headers is None and offset is None:
+            chunk = pd.DataFrame(columns=job.normalise(self.read_headers(job.input_path)))
+            self.write(job.digest_frame(chunk), job.write_path)
+        job.report('writing')
+        return count
+
+    def pseudonymise_incremental(self, job):
+        """
+        When the bytes the last run read are unchanged and end on a line break,
+        only the bytes after them are parsed, hashed and appended to the output.
+        """
+        size = os.path.getsize(job.input_path)
+        manifest = job.previous_manifest()
+        if manifest is not None and manifest['input_size'] > size:
+            manifest = job.rebuild('the input is shorter than the last run read')
+        if manifest is not None:
+            with job.timed('read'):
+                before, checksum = file_checksums(job.input_path, manifest['input_size'], size)
+            if before != manifest['checksum'] or not ends_with_newline(job.input_path, manifest['input_size']):
+                manifest = job.rebuild('rows processed by the last run have changed')
+        else:
+            with job.timed('read'):
+                checksum, = file_checksums(job.input_path, size)
+
+        if manifest is None:
+            rows = self.pseudonymise(job)
+            total = rows
+        elif manifest['input_size'] == size:
+            job.delta = 'unchanged'
+            rows = 0
+            total = manifest['rows']
+        else:
+            job.delta = 'append'
+            job.rows_done = manifest['rows']
+            rows = self.pseudonymise(job, manifest['input_size'])
+            total = manifest['rows'] + rows
+        job.record_manifest(total, size, checksum)
+        return rows
+
+    def passthrough(self, job, offset=None):
+        """
+        Streams Arrow record batches with every column typed as string, so the
+        untouched columns stay in Arrow buffers and are written back verbatim;
+        only the chosen columns become Python values for hashing.
+        """
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+
+        job.report('loading')
+        raw_headers = cached_headers(self, job.input_path)
+        headers = list(job.normalise(raw_headers))
+        indexes = job.column_indexes(headers)
+        checkpoint = job.resume_point() if offset is None else None
+        with self.source(job, offset) as source:
+            reader = pacsv.open_csv(
+                source,
+                read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_BYTES,
+                                               column_names=raw_headers if offset is not None else None),
+                parse_options=pacsv.ParseOptions(delimiter=self.sep),
+                convert_options=pacsv.ConvertOptions(column_types={h: pa.string() for h in raw_headers},
+                                                     strings_can_be_null=False))
+            return self.passthrough_batches(job, reader, headers, indexes, offset, checkpoint)
+
+    def passthrough_batches(self, job, reader, headers, indexes, offset, checkpoint=None):
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        from PseudoColumns import digest_arrow
+
+        write_options = pacsv.WriteOptions(delimiter=self.sep, quoting_style='needed',
+                                           include_header=offset is None and checkpoint is None)
+        job.report('pseudonymising')
+        if offset is None:
+            job.start_output(checkpoint)
+        # the writer goes through this handle, so its position is the output size to checkpoint
+        sink = open(job.write_path, 'ab')
+        writer = None
+        count = 0
+        try:
+            for index, batch in enumerate(job.timed_iter('read', reader)):
+                if checkpoint is not None and index < checkpoint['chunks']:
+                    count += batch.num_rows
+                    job.rows_done = count
+                    continue
+                table = pa.Table.from_batches([batch]).rename_columns(headers)
+                digests = job.hash_arrays([na_text(table.column(index)) for index in indexes])
+                table = table.drop(job.columns)
+                for name, digest in zip(job.digest_names(), digests):
+                    table = table.append_column(name, digest_arrow(digest, pa.string()))
+                with job.timed('write'):
+                    if writer is None:
+                        writer = pacsv.CSVWriter(sink, table.schema, write_options=write_options)
+                    writer.write_table(table)
+                count += table.num_rows
+                if offset is None:
+                    sink.flush()
+                    job.checkpoint(index + 1, count, sink.tell())
+            if writer is None and offset is None and checkpoint is None:
+                names = job.output_headers(headers)
+                schema = pa.schema([pa.field(name, pa.string()) for name in names])
+                writer = pacsv.CSVWriter(sink, schema, write_options=write_options)
+                writer.write_table(schema.empty_table())
+        finally:
+            if writer is not None:
+                writer.close()
+            sink.close()
+        job.report('writing')
+        return count
+
+
+class TsvFormat(CsvFormat):
+    name = 'tsv'
+    extensions = ('.tsv', '.tab')
+    sep = '\t'
+
+
+class ParquetFormat:
+    name = 'parquet'
+    extensions = ('.parquet', '.pq')
+    binary_digests = True
+    multi_sheet = False
+    appendable = False
+    resumable = False
+
+    def read_headers(self, path):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+
+    def read(self, path):
+        return pd.read_parquet(path)
+
+    def write(self, df, path):
+        df.to_parquet(path, index=False)
+
+    def pseudonymise(self, job):
+        """
+        Works a row group at a time on Arrow tables: only the chosen column is
+        converted for hashing, every other column is written back untouched.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from PseudoColumns import digest_arrow
+
+        job.report('loading')
+        source = pq.ParquetFile(job.input_path)
+        digest_type = pa.binary() if job.hasher.binary else pa.string()
+        job.rows_total = source.metadata.num_rows
+        headers = list(job.normalise(source.schema_arrow.names))
+        indexes = job.column_indexes(headers)
+
+        job.report('pseudonymising')
+        job.remove_output()
+        writer = None
+        count = 0
+        try:
+            for group in range(source.num_row_groups):
+                with job.timed('read'):
+                    table = source.read_row_group(group).rename_columns(headers)
+                digests = job.hash_arrays([table.column(index) for index in indexes])
+                table = table.drop(job.columns)
+                for name, digest in zip(job.digest_names(), digests):
+                    table = table.append_column(name, digest_arrow(digest, digest_type))
+                with job.timed('write'):
+                    if writer is None:
+                        writer = pq.ParquetWriter(job.write_path, table.schema)
+                    writer.write_table(table)
+                count += table.num_rows
+            if writer is None:
+                fields = [pa.field(h, f.type) for h, f in zip(headers, source.schema_arrow) if h not in job.columns]
+                schema = pa.schema(fields + [pa.field(name, digest_type) for name in job.digest_names()])
+                writer = pq.ParquetWriter(job.write_path, schema)
+        finally:
+            if writer is not None:
+                writer.close()
+        job.report('writing')
+        return count
+
+
+FORMATS = [ExcelFormat(), CsvFormat(), TsvFormat(), ParquetFormat()]
+
+
+def get_format(path, name=None):
+    if name:
+        for fmt in FORMATS:
+            if fmt.name == name:
+                return fmt
+        raise ValueError('Unknown format: {}'.format(name))
+    extension = os.path.splitext(str(path))[1].lower()
+    for fmt in FORMATS:
+        if extension in fmt.extensions:
+            return fmt
+    raise ValueError('Unsupported file type: {}'.format(extension))
+
+
+def data_file_types():
+    types = [(fmt.name, ' '.join('*' + e for e in fmt.extensions)) for fmt in FORMATS]
+    return tuple([('all supported', ' '.join(pattern for name, pattern in types))] + types)
+
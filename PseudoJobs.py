@@ -0,0 +1,96 @@
+import sys
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Runs queued pseudonymisation jobs one after another on a worker thread.
+    The worker never touches Tk: it puts event dicts on a queue which poll()
+    drains on the Tk thread through widget.after(), handing each to on_event.
+
+    Events have a 'type' of started, progress, done, failed, cancelled or
+    idle, plus the job 'path' and, for progress, 'phase', 'rows' and 'total'.
+    """
+
+    def __init__(self, widget, on_event, poll_ms=100):
+        self.widget = widget
+        self.on_event = on_event
+        self.poll_ms = poll_ms
+        self.jobs = queue.Queue()
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        # running only changes under lock, so a job put as the worker finds the queue empty is never stranded
+        self.lock = threading.Lock()
+        self.running = False
+        self.worker = None
+        self.widget.after(self.poll_ms, self.poll)
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def busy(self):
+        with self.lock:
+            return self.running
+
+    def submit(self, path, run):
+        """
+        run is called on the worker thread as run(progress, cancel) and should
+        return the stats of the run.
+        """
+        with self.lock:
+            self.jobs.put((path, run))
+            if self.running:
+                return
+            self.running = True
+            self.cancel_event.clear()
+        self.worker = threading.Thread(target=self.work, daemon=True)
+        self.worker.start()
+
+    def cancel(self):
+        # stops the running job at its next block and drops the ones waiting
+        self.cancel_event.set()
+
+    def emit(self, kind, path=None, **details):
+        details.update(type=kind, path=path)
+        self.events.put(details)
+
+    def work(self):
+        # imported here so the dialogs can show their window before the engine loads
+        from PseudoEngine import JobCancelled
+        while True:
+            with self.lock:
+                try:
+                    path, run = self.jobs.get_nowait()
+                except queue.Empty:
+                    self.running = False
+                    self.emit('idle')
+                    return
+            if self.cancel_event.is_set():
+                self.emit('cancelled', path)
+                continue
+            self.emit('started', path)
+            try:
+                stats = run(lambda phase, rows, total: self.emit('progress', path, phase=phase, rows=rows, total=total),
+                            self.cancel_event)
+            except JobCancelled:
+                self.emit('cancelled', path)
+            except Exception as error:
+                exc_type, exc_value, exc_traceback = sys.exc_info()
+                self.emit('failed', path, error=error, line=exc_traceback.tb_lineno)
+            else:
+                self.emit('done', path, stats=stats)
+
+    def poll(self):
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event['type'] == 'idle':
+                    self.cancel_event.clear()
+                self.on_event(event)
+        except queue.Empty:
+            pass
+        self.widget.after(self.poll_ms, self.poll)
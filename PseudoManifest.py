@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+MANIFEST_SUFFIX = '.manifest.json'
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+CHECKSUM_BLOCK_BYTES = 1024 * 1024
+
+
+def manifest_path(output_path):
+    return output_path + MANIFEST_SUFFIX
+
+
+def file_checksums(path, *sizes):
+    """
+    blake2b of the first n bytes of a file for each n given, in one read, so
+    the bytes the last run processed and the whole file are checked together.
+    """
+    checksum = hashlib.blake2b()
+    digests = {}
+    position = 0
+    with open(path, 'rb') as f:
+        for size in sorted(sizes):
+            while position < size:
+                block = f.read(min(CHECKSUM_BLOCK_BYTES, size - position))
+                if not block:
+                    break
+                checksum.update(block)
+                position += len(block)
+            digests[size] = checksum.hexdigest()
+    return [digests[size] for size in sizes]
+
+
+def ends_with_newline(path, size):
+    if size == 0:
+        return True
+    with open(path, 'rb') as f:
+        f.seek(size - 1)
+        return f.read(1) == b'\n'
+
+
+def frame_checksums(df, *rows):
+    """
+    blake2b over the column names and a vectorised hash of the first n rows
+    for each n given, for formats like xlsx whose bytes all change when rows
+    are appended.
+    """
+    columns = '\x00'.join(map(str, df.columns)).encode('utf-8')
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+    return [hashlib.blake2b(columns + hashes[:n].tobytes()).hexdigest() for n in rows]
+
+
+def load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(path, record):
+    # written beside the target and swapped in, so a crash never leaves half a record
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(record, f, indent=2)
+    os.replace(temp, path)
+
+
+def remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def load_manifest(output_path):
+    return load_json(manifest_path(output_path))
+
+
+def save_manifest(output_path, record):
+    save_json(manifest_path(output_path), record)
+
+
+def remove_manifest(output_path):
+    remove_file(manifest_path(output_path))
+
+
+def checkpoint_path(output_path):
+    return output_path + CHECKPOINT_SUFFIX
+
+
+def load_checkpoint(output_path):
+    return load_json(checkpoint_path(output_path))
+
+
+def save_checkpoint(output_path, record):
+    save_json(checkpoint_path(output_path), record)
+
+
+def remove_checkpoint(output_path):
+    remove_file(checkpoint_path(output_path))
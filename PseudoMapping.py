@@ -0,0 +1,248 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MAPPING_EXTENSIONS = {'parquet': '.mapping.parquet', 'binary': '.mapping.bin'}
+MAPPING_FORMATS = tuple(MAPPING_EXTENSIONS)
+# lookups of fewer digests than this search the digests directly, more build the prefix index
+PREFIX_LOOKUPS = 1024
+BINARY_MAGIC = b'PSEUDMAP'
+METADATA_KEY = b'pseudo_mapping'
+
+
+def mapping_name(output_path, fmt='parquet'):
+    return os.path.splitext(output_path)[0] + MAPPING_EXTENSIONS[fmt]
+
+
+def mapping_format(path):
+    return 'parquet' if path.endswith('.parquet') else 'binary'
+
+
+def digest_array(digests, width=None):
+    """
+    Digests as one fixed width bytes array, the form they are sorted and
+    searched in. hex and base64 digests are ascii, raw digests are bytes.
+    """
+    dtype = 'S{}'.format(width) if width else 'S'
+    if isinstance(digests, np.ndarray) and digests.dtype.kind == 'S':
+        return digests if not width or digests.dtype.itemsize == width else digests.astype(dtype)
+    digests = np.asarray(digests, dtype=object)
+    try:
+        return digests.astype(dtype)
+    except UnicodeEncodeError:
+        # only a mistyped lookup holds non-ascii text, and it cannot match
+        return np.array([d.encode('utf-8') if isinstance(d, str) else d for d in digests], dtype=dtype)
+
+
+def digest_prefixes(digests):
+    """
+    The first 8 bytes of each digest as a big endian integer, which sorts the
+    same way as the digests and is far quicker to search.
+    """
+    width = digests.dtype.itemsize
+    prefixes = np.zeros((len(digests), 8), dtype=np.uint8)
+    prefixes[:, :min(width, 8)] = np.asarray(digests).view(np.uint8).reshape(len(digests), width)[:, :8]
+    return prefixes.view('>u8')[:, 0]
+
+
+def sorted_unique(values, digests):
+    """
+    (values, digests) sorted by digest with repeats dropped; a digest always
+    comes from one value, so equal digests are the same entry seen twice.
+    """
+    order = np.argsort(digests, kind='stable')
+    values, digests = values[order], digests[order]
+    keep = np.ones(len(digests), dtype=bool)
+    keep[1:] = digests[1:] != digests[:-1]
+    return values[keep], digests[keep]
+
+
+class MappingCollector:
+    """
+    Gathers each distinct value and its digest from the blocks a run hashes,
+    so the mapping is written from what the run already computed rather than
+    from a second pass over the file.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.digests = []
+
+    def add(self, strings, digests):
+        if isinstance(strings, pa.Array):
+            encoded = strings.dictionary_encode()
+            codes = encoded.indices.to_numpy()
+            uniques = encoded.dictionary.to_numpy(zero_copy_only=False)
+        else:
+            codes, uniques = pd.factorize(np.asarray(strings, dtype=object))
+        _, first = np.unique(codes, return_index=True)
+        self.values.append(np.asarray(uniques, dtype=object))
+        # fixed width digests stay in their bytes array, picked rows only
+        digests = digests if isinstance(digests, np.ndarray) and digests.dtype.kind == 'S' \
+            else np.asarray(digests, dtype=object)
+        self.digests.append(digests[first])
+
+    def table(self, previous=None):
+        values = self.values + ([previous.all_values()] if previous is not None else [])
+        digests = [digest_array(block) for block in self.digests] + ([previous.digests] if previous is not None else [])
+        if not values:
+            return np.empty(0, dtype=object), np.empty(0, dtype='S1')
+        digests = np.concatenate(digests)
+        return sorted_unique(np.concatenate(values), digests)
+
+
+def write_parquet_mapping(path, values, digests, binary, settings):
+    if binary:
+        # straight from the array's buffer, as numpy drops trailing zero bytes from items
+        width = digests.dtype.itemsize
+        column = pa.FixedSizeBinaryArray.from_buffers(pa.binary(width), len(digests),
+                                                      [None, pa.py_buffer(digests.tobytes())])
+    else:
+        column = pa.array(digests.astype(str), pa.string())
+    table = pa.table({'digest': column, 'value': pa.array(values, pa.string())})
+    table = table.replace_schema_metadata({METADATA_KEY: json.dumps(settings).encode('utf-8')})
+    pq.write_table(table, path)
+
+
+def write_binary_mapping(path, values, digests, settings):
+    """
+    BINARY_MAGIC, a little endian uint64 header length and a JSON header, then
+    the sorted fixed width digests, rows + 1 uint64 offsets and the utf-8
+    values they point into. Every section starts on an 8 byte boundary so the
+    file can be memory mapped and searched without loading it.
+    """
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.uint64, count=len(encoded)), out=offsets[1:])
+    width = digests.dtype.itemsize
+    header = dict(settings, rows=len(values), width=width)
+    text = json.dumps(header).encode('utf-8')
+    text += b' ' * (-(len(BINARY_MAGIC) + 8 + len(text)) % 8)
+    with open(path, 'wb') as f:
+        f.write(BINARY_MAGIC)
+        f.write(np.uint64(len(text)).astype('<u8').tobytes())
+        f.write(text)
+        f.write(digests.tobytes())
+        f.write(b'\x00' * (-(len(values) * width) % 8))
+        f.write(offsets.tobytes())
+        f.write(b''.join(encoded))
+
+
+def write_mapping(path, values, digests, binary, settings):
+    # written beside the final name and swapped in, as the manifest is
+    temp = path + '.tmp'
+    if mapping_format(path) == 'parquet':
+        write_parquet_mapping(temp, values, digests, binary, settings)
+    else:
+        write_binary_mapping(temp, values, digests, settings)
+    os.replace(temp, path)
+
+
+class MappingTable:
+    """
+    A mapping file opened for reverse lookup: digests are held sorted as a
+    fixed width array and found with np.searchsorted, O(log n) each, and
+    values() answers millions of digests in one vectorised search. A binary
+    mapping is memory mapped, so only the pages a lookup touches are read.
+    Mapping files hold identifiers in the clear and need the same protection
+    as the source files.
+    """
+
+    def __init__(self, digests, values, offsets=None, settings=None):
+        self.digests = digests
+        self.prefixes = None
+        self.values_data = values
+        self.offsets = offsets
+        self.settings = settings or {}
+
+    @classmethod
+    def open(cls, path):
+        if mapping_format(path) == 'parquet':
+            table = pq.read_table(path)
+            metadata = table.schema.metadata or {}
+            settings = json.loads(metadata[METADATA_KEY]) if METADATA_KEY in metadata else {}
+            digests = digest_array(table.column('digest').to_numpy(zero_copy_only=False))
+            return cls(digests, table.column('value').to_numpy(zero_copy_only=False).astype(object),
+                       settings=settings)
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(data[:len(BINARY_MAGIC)]) != BINARY_MAGIC:
+            raise ValueError('{} is not a mapping file'.format(path))
+        start = len(BINARY_MAGIC) + 8
+        length = int(data[len(BINARY_MAGIC):start].view('<u8')[0])
+        settings = json.loads(bytes(data[start:start + length]).decode('utf-8'))
+        rows, width = settings['rows'], settings['width']
+        start += length
+        digests = data[start:start + rows * width].view('S{}'.format(width))
+        start += rows * width + (-(rows * width) % 8)
+        offsets = data[start:start + (rows + 1) * 8].view('<u8')
+        return cls(digests, data[start + (rows + 1) * 8:], offsets, settings)
+
+    def __len__(self):
+        return len(self.digests)
+
+    def value(self, i):
+        if self.offsets is None:
+            return self.values_data[i]
+        return bytes(self.values_data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def decode(self, positions):
+        # slices of one memoryview, so nothing but the values asked for is copied
+        blob = memoryview(self.values_data)
+        starts = self.offsets[positions].tolist()
+        ends = self.offsets[positions + 1].tolist()
+        return [str(blob[start:end], 'utf-8') for start, end in zip(starts, ends)]
+
+    def all_values(self):
+        if self.offsets is None:
+            return np.asarray(self.values_data, dtype=object)
+        values = np.empty(len(self), dtype=object)
+        values[:] = self.decode(np.arange(len(self)))
+        return values
+
+    def positions(self, digests):
+        """
+        Index of each digest in the table, or -1 where it is not there.
+        """
+        width = self.digests.dtype.itemsize
+        query = np.asarray(digests, dtype=object)
+        sizes = np.fromiter(map(len, query), dtype=np.int64, count=len(query))
+        query = digest_array(query, width)
+        if not len(self.digests):
+            return np.full(len(query), -1, dtype=np.int64)
+        if len(query) < PREFIX_LOOKUPS and self.prefixes is None:
+            found = np.searchsorted(self.digests, query)
+            found[found == len(self.digests)] = 0
+            return np.where((self.digests[found] == query) & (sizes == width), found, -1)
+        if self.prefixes is None:
+            self.prefixes = digest_prefixes(self.digests)
+        # the prefix search lands on the first digest sharing the prefix, which
+        # is nearly always the one; the rare others get a full digest search
+        found = np.searchsorted(self.prefixes, digest_prefixes(query))
+        found[found == len(self.digests)] = 0
+        hit = self.digests[found] == query
+        retry = np.flatnonzero(~hit & (self.prefixes[found] == digest_prefixes(query)))
+        if len(retry):
+            exact = np.searchsorted(self.digests, query[retry])
+            exact[exact == len(self.digests)] = 0
+            found[retry] = exact
+            hit[retry] = self.digests[exact] == query[retry]
+        return np.where(hit & (sizes == width), found, -1)
+
+    def values(self, digests):
+        """
+        The value behind each digest, None where the table has no such digest.
+        """
+        positions = self.positions(digests)
+        values = np.empty(len(positions), dtype=object)
+        hit = positions >= 0
+        if self.offsets is None:
+            values[hit] = self.values_data[positions[hit]]
+        else:
+            values[hit] = self.decode(positions[hit])
+        return values
+
+    def lookup(self, digest):
+        return self.values([digest])[0]
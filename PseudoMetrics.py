@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import logging
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+metrics_logger = logging.getLogger('pseudo.metrics')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+class RunMetrics:
+    """
+    Accumulates time spent in each phase of a run. A phase may be entered many
+    times (once per chunk or block when streaming) and its spans are summed.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def timed_iter(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record(self, rows, input_path, output_path):
+        seconds = time.perf_counter() - self.started
+        return {'seconds': round(seconds, 4),
+                'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+                'phases': {name: round(value, 4) for name, value in self.phases.items()},
+                'peak_rss_mb': peak_rss_mb(),
+                'bytes_read': file_size(input_path),
+                'bytes_written': file_size(output_path)}
+
+
+def log_record(event, record):
+    metrics_logger.info(json.dumps(dict(record, event=event), default=str, sort_keys=True))
+
+
+@contextmanager
+def profiled(prefix):
+    """
+    Writes <prefix>.prof (cProfile, for pstats or snakeviz) and
+    <prefix>.tracemalloc.txt (top allocation sites) around the block.
+    """
+    if not prefix:
+        yield
+        return
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(prefix + '.prof')
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(prefix + '.tracemalloc.txt', 'w') as f:
+            f.write('current {} bytes, peak {} bytes\n'.format(current, peak))
+            for stat in snapshot.statistics('lineno')[:50]:
+                f.write(str(stat) + '\n')
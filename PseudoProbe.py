@@ -0,0 +1,183 @@
+import os
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIPS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+OFFICE_RELATIONSHIPS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+DEFAULT_SHEET = 'xl/worksheets/sheet1.xml'
+
+header_cache = {}
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def cached_headers(fmt, path):
+    """
+    Headers keyed by path, mtime and size, so picking a file in the dialog and
+    then pseudonymising it, or running many files of one layout, only probes
+    each file once until it changes on disk.
+    """
+    key = file_key(path) + (fmt.name,)
+    headers = header_cache.get(key)
+    if headers is None:
+        headers = fmt.read_headers(path)
+        header_cache[key] = headers
+    return list(headers)
+
+
+def sheet_paths(archive):
+    """
+    [(sheet name, part path)] in workbook order, read from workbook.xml and
+    its relationships without loading any sheet.
+    """
+    try:
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        relations = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    except KeyError:
+        return [('Sheet1', DEFAULT_SHEET)]
+    targets = {}
+    for relation in relations.iter(RELATIONSHIPS + 'Relationship'):
+        target = relation.get('Target')
+        if target.startswith('/'):
+            targets[relation.get('Id')] = target.lstrip('/')
+        else:
+            targets[relation.get('Id')] = posixpath.normpath(posixpath.join('xl', target))
+    sheets = [(sheet.get('name'), targets.get(sheet.get(OFFICE_RELATIONSHIPS + 'id')))
+              for sheet in workbook.iter(MAIN + 'sheet')]
+    return [(name, path) for name, path in sheets if path] or [('Sheet1', DEFAULT_SHEET)]
+
+
+def first_sheet_path(archive):
+    return sheet_paths(archive)[0][1]
+
+
+def sheet_names(path):
+    with zipfile.ZipFile(path) as archive:
+        return [name for name, part in sheet_paths(archive)]
+
+
+def column_number(reference):
+    letters = re.match(r'[A-Z]+', reference).group(0)
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number - 1
+
+
+def cell_text(cell):
+    return ''.join(t.text or '' for t in cell.iter(MAIN + 't'))
+
+
+def shared_string_text(item):
+    # plain <t>, or rich text runs <r><t>; phonetic <rPh> runs are not part of the value
+    parts = []
+    for child in item:
+        if child.tag == MAIN + 't':
+            parts.append(child.text or '')
+        elif child.tag == MAIN + 'r':
+            parts.extend(t.text or '' for t in child.iter(MAIN + 't'))
+    return ''.join(parts)
+
+
+def number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def read_first_row(archive, sheet_path):
+    """
+    Returns ({column number: (type, raw value)}, width) for the first row,
+    stopping the parse at the end of that row instead of reading the rest of
+    the sheet. A sheet whose first row element is not row 1 starts with empty
+    rows, so like read_excel its header row is empty. width is the sheet's
+    width from its dimension element, or None when it has no rows.
+    """
+    cells = {}
+    position = 0
+    width = None
+    rows = False
+    with archive.open(sheet_path) as sheet:
+        for event, element in ET.iterparse(sheet, events=('start', 'end')):
+            if event == 'start':
+                if element.tag == MAIN + 'row':
+                    rows = True
+                    if element.get('r', '1') != '1':
+                        break
+                continue
+            if element.tag == MAIN + 'dimension':
+                # A3:B9, or A1 alone for a sheet of one cell
+                width = column_number(element.get('ref', 'A1').split(':')[-1]) + 1
+            elif element.tag == MAIN + 'c':
+                # the r reference is optional, cells without one follow the previous cell
+                reference = element.get('r')
+                position = column_number(reference) if reference else position
+                kind = element.get('t', 'n')
+                if kind == 'inlineStr':
+                    raw = cell_text(element)
+                else:
+                    value = element.find(MAIN + 'v')
+                    raw = value.text if value is not None else None
+                if raw is not None:
+                    cells[position] = (kind, raw)
+                position += 1
+            elif element.tag == MAIN + 'row':
+                break
+    return cells, width if rows else None
+
+
+def read_shared_strings(archive, wanted):
+    """
+    Reads the shared strings table only as far as the highest index the
+    header needs.
+    """
+    strings = {}
+    if not wanted:
+        return strings
+    last = max(wanted)
+    index = 0
+    with archive.open('xl/sharedStrings.xml') as table:
+        for event, element in ET.iterparse(table, events=('end',)):
+            if element.tag == MAIN + 'si':
+                if index in wanted:
+                    strings[index] = shared_string_text(element)
+                if index >= last:
+                    break
+                index += 1
+                element.clear()
+    return strings
+
+
+def probe_xlsx_headers(path, sheet=None):
+    """
+    Reads the header row of the first sheet, or of the sheet named, straight
+    from the xlsx XML, naming empty header cells 'Unnamed: n' the way
+    read_excel does.
+    """
+    with zipfile.ZipFile(path) as archive:
+        if sheet is None:
+            sheet_path = first_sheet_path(archive)
+        else:
+            sheet_path = dict(sheet_paths(archive))[sheet]
+        cells, width = read_first_row(archive, sheet_path)
+        shared = read_shared_strings(archive, {int(raw) for kind, raw in cells.values() if kind == 's'})
+    headers = []
+    # columns wider than the header row are named too, as read_excel names them
+    for i in range(max(max(cells) + 1 if cells else 0, width or 0)):
+        kind, raw = cells.get(i, (None, None))
+        if raw is None:
+            headers.append('Unnamed: {}'.format(i))
+        elif kind == 's':
+            headers.append(shared[int(raw)])
+        elif kind == 'n':
+            headers.append(number(raw))
+        elif kind == 'b':
+            headers.append(raw == '1')
+        else:
+            headers.append(raw)
+    return headers
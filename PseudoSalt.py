@@ -0,0 +1,88 @@
+import hashlib
+import pem
+from PseudoProbe import file_key
+
+
+def salt_fingerprint(salt):
+    # the cache never holds the salt itself, only a digest of it
+    return hashlib.blake2s(str(salt).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def salt_key(salt, algorithm):
+    """
+    The salt as a BLAKE2 key. Salts longer than the algorithm allows (a cert
+    sha1 is 40 characters, blake2s keys stop at 32 bytes) are first hashed
+    down to the longest key it takes.
+    """
+    key = str(salt).encode('utf-8')
+    max_size = getattr(hashlib, algorithm).MAX_KEY_SIZE
+    if len(key) > max_size:
+        key = hashlib.blake2b(key, digest_size=max_size).digest()
+    return key
+
+
+def first_pem_object(path):
+    """
+    The first object pem.parse_file() would return, reading no further than
+    its END line, so a chain bundle costs the same as a single cert. Only the
+    lines from BEGIN to END go to pem, which makes its sha1_hexdigest the same
+    as when the whole file is parsed.
+    """
+    block = []
+    with open(path, 'rb') as f:
+        for line in f:
+            if b'BEGIN ' in line and b'----' in line:
+                block = [line]
+            elif block:
+                block.append(line)
+                if b'END ' in line and b'----' in line:
+                    objects = pem.parse(b''.join(block))
+                    if objects:
+                        return objects[0]
+                    block = []
+    raise ValueError('No PEM object found in {}'.format(path))
+
+
+class SaltManager:
+    """
+    Salts and keys for a session. A cert is parsed once for as long as its
+    path, mtime and size stay the same, and the key derived from a salt is
+    kept per salt fingerprint and algorithm as bytes, so hashing is handed
+    plain values rather than re-reading files or UI state.
+    """
+
+    def __init__(self):
+        self.salts = {}
+        self.keys = {}
+
+    def cert_salt(self, path):
+        key = file_key(path)
+        salt = self.salts.get(key)
+        if salt is None:
+            salt = first_pem_object(path).sha1_hexdigest
+            self.salts[key] = salt
+        return salt
+
+    def file_salt(self, path):
+        # the first line of a text file, newline included, as the dialogs always read it
+        with open(path) as f:
+            return f.readline()
+
+    def key(self, salt, algorithm):
+        cache_key = (salt_fingerprint(salt), algorithm)
+        key = self.keys.get(cache_key)
+        if key is None:
+            key = salt_key(salt, algorithm)
+            self.keys[cache_key] = key
+        return key
+
+    def clear(self):
+        self.salts.clear()
+        self.keys.clear()
+
+
+salts = SaltManager()
+
+
+def cert_salt(path):
+    return salts.cert_salt(path)
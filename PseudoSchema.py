@@ -0,0 +1,129 @@
+import os
+import json
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALIASES = 'column_aliases.json'
+SCHEMA_CACHE_SIZE = 4096
+HEADER_TRANSLATION = str.maketrans({' ': '_', '(': None, ')': None})
+
+
+class HeaderCollisionError(ValueError):
+
+    def __str__(self):
+        name, headers = self.args
+        return "Headers {} all become '{}'".format(', '.join(map(repr, headers)), name)
+
+
+def normalise_header(name):
+    # strip, lower, spaces to underscores and brackets dropped in one translate
+    return name.strip().lower().translate(HEADER_TRANSLATION) if isinstance(name, str) else name
+
+
+def lower_header(name):
+    return name.lower() if isinstance(name, str) else name
+
+
+def normalise_headers(columns):
+    return pd.Index([normalise_header(name) for name in columns])
+
+
+def lower_headers(columns):
+    return pd.Index([lower_header(name) for name in columns])
+
+
+# header_normaliser functions that can be applied one header at a time
+HEADER_FUNCTIONS = {normalise_headers: normalise_header, lower_headers: lower_header}
+
+
+def load_aliases(path):
+    with open(path) as f:
+        aliases = json.load(f)
+    if not isinstance(aliases, dict):
+        raise ValueError('{} should map header names to column names'.format(path))
+    return {str(header): str(column) for header, column in aliases.items()}
+
+
+def saved_aliases(path=DEFAULT_ALIASES):
+    # the dialogs pick up an alias file kept beside the app, when there is one
+    return load_aliases(path) if os.path.exists(path) else None
+
+
+def save_aliases(path, aliases):
+    with open(path, 'w') as f:
+        json.dump(dict(sorted(aliases.items())), f, indent=2)
+
+
+class HeaderSchema:
+    """
+    Turns a file's raw headers into the column names the engine works with:
+    the header_normaliser, then any aliases such as {"Patient ID": "identifier"}
+    (alias keys are normalised the same way, so they match whatever spacing or
+    case a file uses). The names are worked out once per distinct header row
+    and kept, so thousands of files with the same layout share one lookup.
+    Headers that end up with the same name are collisions: an error when a
+    column being pseudonymised is one of them, a warning otherwise.
+    """
+
+    def __init__(self, normaliser=normalise_headers, aliases=None, size=SCHEMA_CACHE_SIZE):
+        self.normaliser = normaliser
+        self.header = HEADER_FUNCTIONS.get(normaliser)
+        self.aliases = {}
+        if aliases:
+            for header, column in zip(self.normalise(list(aliases)), aliases.values()):
+                self.aliases[header] = column
+        self.size = size
+        self.layouts = {}
+
+    @property
+    def name(self):
+        return getattr(self.normaliser, '__name__', None)
+
+    def normalise(self, headers):
+        if self.normaliser is None:
+            return list(headers)
+        if self.header is not None:
+            return [self.header(name) for name in headers]
+        return list(self.normaliser(pd.Index(headers)))
+
+    def layout(self, headers):
+        key = tuple(headers)
+        layout = self.layouts.get(key)
+        if layout is None:
+            names = tuple(self.aliases.get(name, name) for name in self.normalise(key))
+            sources = {}
+            for raw, name in zip(key, names):
+                sources.setdefault(name, []).append(raw)
+            collisions = {name: raws for name, raws in sources.items() if len(raws) > 1}
+            for name, raws in collisions.items():
+                logger.warning("Headers %s all become '%s'", ', '.join(map(repr, raws)), name)
+            if len(self.layouts) >= self.size:
+                del self.layouts[next(iter(self.layouts))]
+            layout = names, collisions
+            self.layouts[key] = layout
+        return layout
+
+    def names(self, headers, columns=()):
+        names, collisions = self.layout(headers)
+        for column in columns:
+            if column in collisions:
+                raise HeaderCollisionError(column, collisions[column])
+        return list(names)
+
+
+schemas = {}
+
+
+def header_schema(normaliser=normalise_headers, aliases=None):
+    """
+    One shared HeaderSchema per normaliser and alias mapping, so every job in
+    a session or CLI worker process reuses the layouts already worked out.
+    """
+    key = normaliser, tuple(sorted((aliases or {}).items()))
+    schema = schemas.get(key)
+    if schema is None:
+        schema = HeaderSchema(normaliser, aliases)
+        schemas[key] = schema
+    return schema
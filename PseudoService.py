@@ -0,0 +1,448 @@
+import os
+import json
+import stat
+import time
+import socket
+import logging
+import ipaddress
+import threading
+import socketserver
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PseudoEngine import Hasher, Pseudonymiser, MissingColumnError, chunk_values, value_strings, output_name
+from PseudoMetrics import log_record
+from PseudoColumns import text_array, text_chunks, digest_arrow
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+STREAM_BLOCK_VALUES = 65536
+POOL_MIN_VALUES = 100000
+LATENCY_WINDOW = 10000
+HASH_OPTIONS = ('salt', 'hash_mode', 'algorithm', 'digest_size', 'encoding')
+FILE_OPTIONS = ('output_path', 'format', 'passthrough', 'streaming', 'sheets', 'incremental', 'excel_writer',
+                'aliases', 'mapping')
+
+
+class RequestError(ValueError):
+    pass
+
+
+class ForbiddenError(RequestError):
+    pass
+
+
+def real_roots(roots):
+    return [os.path.realpath(root) for root in roots or ()]
+
+
+def within(path, roots):
+    # symlinks resolved first, so a link inside a root cannot lead out of it
+    path = os.path.realpath(path)
+    return any(os.path.commonpath([path, root]) == root for root in roots)
+
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        addresses = socket.getaddrinfo(host, None)
+    except (socket.gaierror, UnicodeError):
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(address[4][0].split('%')[0]).is_loopback
+                                   for address in addresses)
+
+
+def remove_socket(path):
+    # a Unix socket left behind by an earlier run, never a file that happens to sit there
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError('{} exists and is not a socket, refusing to remove it'.format(path))
+    os.remove(path)
+
+
+def warm_worker(_):
+    # the pool's processes import the engine now rather than on the first request
+    import PseudoEngine
+    return os.getpid()
+
+
+class ServiceMetrics:
+    """
+    Request counts, values hashed and the latencies of the last LATENCY_WINDOW
+    requests, shared by the handler threads.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.errors = 0
+        self.values = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    @contextmanager
+    def request(self, endpoint):
+        with self.lock:
+            self.in_flight += 1
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.latencies.append(time.perf_counter() - started)
+
+    def failed(self):
+        with self.lock:
+            self.errors += 1
+
+    def count(self, values):
+        with self.lock:
+            self.values += values
+
+    def snapshot(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            record = {'requests': dict(self.requests),
+                      'errors': self.errors,
+                      'in_flight': self.in_flight,
+                      'values': self.values}
+        uptime = time.time() - self.started
+        record['uptime_seconds'] = round(uptime, 1)
+        record['values_per_sec'] = round(record['values'] / uptime, 1) if uptime else None
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            record['latency_ms'] = {'p50': round(p50, 3), 'p95': round(p95, 3), 'p99': round(p99, 3),
+                                    'max': round(latencies.max(), 3), 'window': len(latencies)}
+        return record
+
+
+class PseudoService:
+    """
+    What the service keeps between requests: the salts, loaded once at start
+    (never sent back), a Hasher per salt and settings, and a process pool
+    started and warmed before the first request, which large batches and
+    file jobs hash on. Smaller batches hash on the request thread, where
+    sending them to a worker would cost more than it saves.
+
+    File jobs only read below roots and only write, outputs and mappings
+    alike, below output_roots (roots when not given); with no roots the
+    /file endpoint is refused.
+    """
+
+    def __init__(self, salts, workers=None, pool_min_values=POOL_MIN_VALUES, roots=None, output_roots=None):
+        if not salts:
+            raise ValueError('The service needs at least one salt')
+        self.roots = real_roots(roots)
+        self.output_roots = real_roots(output_roots) if output_roots else self.roots
+        self.salts = dict(salts)
+        self.default_salt = next(iter(self.salts))
+        self.workers = workers if workers else os.cpu_count() or 1
+        self.pool_min_values = pool_min_values
+        self.executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self.hashers = {}
+        self.lock = threading.Lock()
+        self.metrics = ServiceMetrics()
+
+    def warm_up(self):
+        if self.executor is not None:
+            pids = set(self.executor.map(warm_worker, range(self.workers)))
+            logger.info('Warmed %s hashing processes', len(pids))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def hasher(self, options):
+        name = options.get('salt') or self.default_salt
+        if name not in self.salts:
+            raise RequestError('Unknown salt {}'.format(name))
+        size = options.get('digest_size')
+        key = (name, options.get('hash_mode') or 'legacy', options.get('algorithm') or 'blake2s',
+               int(size) if size else None, options.get('encoding') or 'hex')
+        with self.lock:
+            hasher = self.hashers.get(key)
+            if hasher is None:
+                try:
+                    hasher = Hasher(self.salts[name], *key[1:])
+                except ValueError as error:
+                    raise RequestError(str(error))
+                self.hashers[key] = hasher
+        return hasher
+
+    def digest_blocks(self, hasher, values):
+        """
+        Digests block by block in request order, so each can be sent as soon
+        as it is ready; large requests spread the blocks over the pool.
+        """
+        strings = value_strings(values)
+        self.metrics.count(len(strings))
+        if self.executor is not None and len(strings) >= self.pool_min_values:
+            blocks = chunk_values(strings, max(-(-len(strings) // STREAM_BLOCK_VALUES), self.workers))
+            yield from self.executor.map(hasher.batch, blocks)
+            return
+        for start in range(0, len(strings), STREAM_BLOCK_VALUES):
+            yield hasher.batch(strings[start:start + STREAM_BLOCK_VALUES])
+
+    def fixed_blocks(self, hasher, column):
+        """
+        digest_blocks() for an Arrow column, hashed from its buffers into fixed
+        width digest arrays without a Python object per value.
+        """
+        values = text_array(column)
+        self.metrics.count(len(values))
+        if self.executor is not None and len(values) >= self.pool_min_values:
+            blocks = text_chunks(values, max(-(-len(values) // STREAM_BLOCK_VALUES), self.workers))
+            yield from self.executor.map(hasher.fixed_batch, blocks)
+            return
+        for start in range(0, len(values), STREAM_BLOCK_VALUES):
+            yield hasher.fixed_batch(values.slice(start, STREAM_BLOCK_VALUES))
+
+    def check_paths(self, path, options):
+        if not self.roots:
+            raise ForbiddenError('File jobs are off: the service was started without --root')
+        if not within(path, self.roots):
+            raise ForbiddenError('{} is outside the input roots'.format(path))
+        for name, target in (('output_path', options.get('output_path') or output_name(path)),
+                             ('mapping', options.get('mapping'))):
+            if target and not within(str(target), self.output_roots):
+                raise ForbiddenError('{} {} is outside the output roots'.format(name, target))
+
+    def run_file(self, request):
+        path = request.get('path')
+        if not path:
+            raise RequestError('The body needs a "path"')
+        options = {name: request[name] for name in FILE_OPTIONS if name in request}
+        # "format" in requests, fmt in Pseudonymiser
+        if 'format' in options:
+            options['fmt'] = options.pop('format')
+        self.check_paths(str(path), options)
+        if not os.path.isfile(path):
+            raise RequestError('No file at {}'.format(path))
+        hasher = self.hasher(request)
+        pseudonymiser = Pseudonymiser(hasher.salt, path, request.get('columns', 'identifier'), hasher=hasher,
+                                      workers=self.workers, executor=self.executor, **options)
+        stats = pseudonymiser.run()
+        self.metrics.count(stats['rows'])
+        return stats
+
+
+class ChunkedBody:
+    """
+    The response body as HTTP/1.1 chunks; file-like so an Arrow stream writer
+    can write straight into it.
+    """
+
+    closed = False
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, data):
+        if data:
+            self.wfile.write(b'%x\r\n' % len(data) + bytes(data) + b'\r\n')
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        pass
+
+    def finish(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    GET /health and /metrics; POST /hash with {"values": [...]} as JSON, or an
+    Arrow IPC stream with a 'values' column (or its first column), and POST
+    /file with {"path": ..., "columns": [...]}. Salt and digest settings come
+    from the query string or the JSON body: salt, hash_mode, algorithm,
+    digest_size and encoding. Digests stream back in the request's own
+    format as they are hashed. /file paths outside the service's roots get
+    a 403.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    service = None
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return str(self.client_address[0]) if self.client_address else 'local socket'
+
+    def log_message(self, format, *args):
+        logger.debug('%s %s', self.address_string(), format % args)
+
+    def send_json(self, status, record):
+        body = json.dumps(record, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        return ChunkedBody(self.wfile)
+
+    def read_body(self):
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError('Requests need a Content-Length')
+        return self.rfile.read(int(length))
+
+    def query(self):
+        return dict(parse_qsl(urlparse(self.path).query))
+
+    def do_GET(self):
+        endpoint = urlparse(self.path).path
+        if endpoint == '/health':
+            self.send_json(200, {'status': 'ok', 'salts': list(self.service.salts), 'workers': self.service.workers})
+        elif endpoint == '/metrics':
+            self.send_json(200, self.service.metrics.snapshot())
+        else:
+            self.send_json(404, {'error': 'No endpoint {}'.format(endpoint)})
+
+    def do_POST(self):
+        endpoint = urlparse(self.path).path
+        handlers = {'/hash': self.hash_request, '/file': self.file_request}
+        if endpoint not in handlers:
+            self.close_connection = True
+            self.send_json(404, {'error': 'No endpoint {}'.format(endpoint)})
+            return
+        self.streaming = False
+        with self.service.metrics.request(endpoint):
+            try:
+                handlers[endpoint]()
+            except ForbiddenError as error:
+                self.fail(403, error)
+            except (RequestError, MissingColumnError, ValueError) as error:
+                self.fail(400, error)
+            except Exception as error:
+                logger.exception('Request to %s failed', endpoint)
+                self.fail(500, error)
+
+    def fail(self, status, error):
+        self.service.metrics.failed()
+        # the body may be unread, and once streaming has started dropping the
+        # connection without the last chunk is the only way left to tell the client
+        self.close_connection = True
+        if not self.streaming:
+            self.send_json(status, {'error': str(error)})
+
+    def hash_request(self):
+        options = self.query()
+        body = self.read_body()
+        if self.headers.get('Content-Type', '').split(';')[0].strip() == ARROW_STREAM:
+            self.hash_arrow(body, options)
+            return
+        try:
+            request = json.loads(body)
+        except ValueError:
+            raise RequestError('The body should be JSON or an Arrow stream')
+        options.update((name, request[name]) for name in HASH_OPTIONS if name in request)
+        values = request.get('values')
+        if not isinstance(values, list):
+            raise RequestError('The body needs a "values" list')
+        hasher = self.service.hasher(options)
+        if hasher.binary:
+            raise RequestError('raw digests can only be sent back in an Arrow stream')
+        body = self.start_stream('application/json')
+        self.streaming = True
+        body.write(b'{"digests": [')
+        separator = b''
+        for digests in self.service.digest_blocks(hasher, values):
+            if len(digests):
+                body.write(separator + json.dumps(digests.tolist())[1:-1].encode('utf-8'))
+                separator = b', '
+        body.write(b']}')
+        body.finish()
+
+    def hash_arrow(self, body, options):
+        import pyarrow as pa
+
+        hasher = self.service.hasher(options)
+        reader = pa.ipc.open_stream(body)
+        digest_type = pa.binary() if hasher.binary else pa.string()
+        schema = pa.schema([pa.field('digest', digest_type)])
+        response = self.start_stream(ARROW_STREAM)
+        self.streaming = True
+        with pa.ipc.new_stream(response, schema) as writer:
+            for batch in reader:
+                column = batch.column('values') if 'values' in batch.schema.names else batch.column(0)
+                for digests in self.service.fixed_blocks(hasher, column):
+                    writer.write_batch(pa.record_batch([digest_arrow(digests, digest_type)], schema=schema))
+        response.finish()
+
+    def file_request(self):
+        try:
+            request = json.loads(self.read_body())
+        except ValueError:
+            raise RequestError('The body should be JSON')
+        request = dict(self.query(), **request)
+        stats = self.service.run_file(request)
+        log_record('service_file', stats)
+        self.send_json(200, stats)
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    UnixHTTPServer = None
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, allow_remote=False):
+    # responses go out as several small writes, which Nagle's algorithm would hold back on TCP
+    handler = type('BoundServiceHandler', (ServiceHandler,),
+                   {'service': service, 'disable_nagle_algorithm': socket_path is None})
+    if socket_path is None:
+        # the service has no authentication, so anyone who can reach it can hash with its salts
+        if not allow_remote and not is_loopback(host):
+            raise ValueError('Refusing to listen on {}, which is not a loopback address; '
+                             'pass --allow-remote to do so anyway'.format(host))
+        return ThreadingHTTPServer((host, port), handler)
+    if UnixHTTPServer is None:
+        raise ValueError('Unix sockets are not available on this platform, use a port')
+    remove_socket(socket_path)
+    return UnixHTTPServer(socket_path, handler)
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, ready=None, allow_remote=False):
+    """
+    Warms the pool, then serves until interrupted. ready, if given, is called
+    with the server once it is listening. Only loopback addresses are
+    listened on unless allow_remote is set.
+    """
+    server = make_server(service, host, port, socket_path, allow_remote)
+    service.warm_up()
+    where = socket_path or 'http://{}:{}'.format(*server.server_address[:2])
+    logger.info('Pseudonymisation service listening on %s with salts %s', where, ', '.join(service.salts))
+    if ready is not None:
+        ready(server)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path is not None:
+            remove_socket(socket_path)
@@ -0,0 +1,28 @@
+import importlib
+import threading
+
+HEAVY_MODULES = ('PseudoEngine', 'PseudoCache', 'PseudoFormats', 'PseudoSalt')
+POLL_MS = 50
+
+
+def warm_up(app, modules=HEAVY_MODULES):
+    """
+    The dialogs import pandas and the engine only when first used, so Tk can
+    draw the window straight away. Once it has been drawn, this imports them
+    on a daemon thread so the first click usually finds them loaded; a click
+    that comes sooner just waits on the same import. Returns an Event set
+    once they are loaded.
+    """
+    warmed = threading.Event()
+
+    def load():
+        for name in modules:
+            importlib.import_module(name)
+        warmed.set()
+
+    def shown():
+        app.update_idletasks()
+        threading.Thread(target=load, daemon=True).start()
+
+    app.after_idle(shown)
+    return warmed
@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import os, sys, json, time
+sys.path.insert(0, {root!r})
+import pandas as pd
+from PseudoEngine import Hasher
+from PseudoColumns import text_array, digest_series
+from PseudoMetrics import peak_rss_mb
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576
+
+df = pd.read_csv({path!r}, dtype='str', usecols=['identifier'])
+before = rss_mb()
+started = time.perf_counter()
+hasher = Hasher('salt')
+if {columnar}:
+    df['DIGEST'] = digest_series(hasher.fixed_batch(text_array(df['identifier'])), df.index)
+else:
+    df['DIGEST'] = hasher.batch(df['identifier'].to_numpy(dtype=object))
+seconds = time.perf_counter() - started
+print(json.dumps({{'held_mb': rss_mb() - before, 'peak_rss_mb': peak_rss_mb(), 'seconds': seconds}}))
+"""
+
+
+def measure(path, columnar):
+    code = CHILD.format(root=ROOT, path=path, columnar=columnar)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory held per row by object and columnar identifier and digest columns")
+    parser.add_argument('--rows', type=int, nargs='+', default=[2000000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print('{:>10} {:>10} {:>10} {:>12} {:>10} {:>9}'.format('rows', 'layout', 'held MB', 'bytes/row',
+                                                               'peak MB', 'seconds'))
+        for rows in args.rows:
+            path = make_file(directory, 'csv', rows, columns=2)
+            for label, columnar in (('object', False), ('columnar', True)):
+                result = measure(path, columnar)
+                print('{:>10} {:>10} {:>10.1f} {:>12.1f} {:>10.1f} {:>9.2f}'.format(
+                    rows, label, result['held_mb'], result['held_mb'] * 1048576 / rows, result['peak_rss_mb'],
+                    result['seconds']))
+
+
+if __name__ == "__main__":
+    main()
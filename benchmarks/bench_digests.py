@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_file
+from PseudoEngine import Hasher, Pseudonymiser
+
+SALT = '2fd4e1c67a2d28fced849ee1bb76e7391b93eb12'
+
+# (label, mode, algorithm, digest_size, encoding, output format)
+MODES = [
+    ('legacy', 'legacy', 'blake2s', None, 'hex', 'csv'),
+    ('blake2s-32-hex', 'keyed', 'blake2s', 32, 'hex', 'csv'),
+    ('blake2s-16-hex', 'keyed', 'blake2s', 16, 'hex', 'csv'),
+    ('blake2s-16-base64', 'keyed', 'blake2s', 16, 'base64', 'csv'),
+    ('blake2b-16-base64', 'keyed', 'blake2b', 16, 'base64', 'csv'),
+    ('blake2b-64-hex', 'keyed', 'blake2b', 64, 'hex', 'csv'),
+    ('legacy parquet', 'legacy', 'blake2s', None, 'hex', 'parquet'),
+    ('blake2s-16-raw parquet', 'keyed', 'blake2s', 16, 'raw', 'parquet'),
+]
+
+
+def rows_per_second(rows, seconds):
+    return rows / seconds if seconds else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare hashing speed and output size of the digest modes")
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--columns', type=int, default=5)
+    args = parser.parse_args()
+
+    values = [str(i * 7919) for i in range(args.rows)]
+    with tempfile.TemporaryDirectory() as directory:
+        source = make_file(directory, 'csv', args.rows, args.columns)
+        parquet = os.path.join(directory, 'source.parquet')
+        pd.read_csv(source, dtype={'identifier': str}).to_parquet(parquet, index=False)
+        inputs = {'csv': source, 'parquet': parquet}
+
+        print('{:<24} {:>14} {:>12} {:>10} {:>10}'.format('mode', 'hash rows/sec', 'output MB', 'write s', 'total s'))
+        for label, mode, algorithm, digest_size, encoding, fmt in MODES:
+            hasher = Hasher(SALT, mode, algorithm, digest_size, encoding)
+            started = time.perf_counter()
+            hasher.batch(values)
+            hash_seconds = time.perf_counter() - started
+
+            output = os.path.join(directory, 'output.' + fmt)
+            stats = Pseudonymiser(SALT, inputs[fmt], output_path=output, hasher=hasher).run()
+            print('{:<24} {:>14,.0f} {:>12.1f} {:>10.2f} {:>10.2f}'.format(
+                label, rows_per_second(len(values), hash_seconds), os.path.getsize(output) / 1048576,
+                stats['phases'].get('write', 0), stats['seconds']))
+            os.remove(output)
+
+
+if __name__ == "__main__":
+    main()
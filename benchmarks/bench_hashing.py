@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import argparse
+import tkinter as tk
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PseudoEngine import pseudo, pseudo_batch, pseudo_parallel
+
+
+def rows_per_second(rows, seconds):
+    return rows / seconds if seconds else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row and batch pseudo() throughput")
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--salt', default='2fd4e1c67a2d28fced849ee1bb76e7391b93eb12')
+    args = parser.parse_args()
+
+    column = pd.Series([str(i * 7919) for i in range(args.rows)], dtype='str')
+
+    # the dialogs used to read the salt back from a tk.StringVar for every row
+    salt_var = tk.StringVar(tk.Tcl(), args.salt)
+    started = time.perf_counter()
+    before = column.apply(lambda x: pseudo(x, salt_var.get()))
+    before_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    after = pseudo_batch(column.to_numpy(dtype=object), args.salt)
+    after_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parallel = pseudo_parallel(column.to_numpy(dtype=object), args.salt, args.workers)
+    parallel_seconds = time.perf_counter() - started
+
+    if list(before) != list(after):
+        sys.exit('batch digests differ from pseudo()')
+    if list(after) != list(parallel):
+        sys.exit('parallel digests differ from pseudo_batch()')
+
+    print('rows            {}'.format(args.rows))
+    print('apply(pseudo)   {:>12,.0f} rows/sec'.format(rows_per_second(args.rows, before_seconds)))
+    print('pseudo_batch    {:>12,.0f} rows/sec'.format(rows_per_second(args.rows, after_seconds)))
+    print('pseudo_parallel {:>12,.0f} rows/sec ({} workers)'.format(
+        rows_per_second(args.rows, parallel_seconds), args.workers))
+
+
+if __name__ == "__main__":
+    main()
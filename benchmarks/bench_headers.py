@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PseudoSchema import HeaderSchema
+
+
+def chained(columns):
+    # the five pandas string passes the engine used to run for every file
+    return columns.str.strip().str.lower()\
+        .str.replace(' ', '_', regex=False).str.replace('(', '', regex=False).str.replace(')', '', regex=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Header normalisation for many files of one layout")
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--columns', type=int, default=30)
+    args = parser.parse_args()
+
+    headers = ['Patient ID'] + ['Column ({})'.format(i) for i in range(1, args.columns)]
+    schema = HeaderSchema(aliases={'Patient ID': 'identifier'})
+
+    started = time.perf_counter()
+    for _ in range(args.files):
+        list(chained(pd.Index(headers)))
+    before = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.files):
+        schema.names(headers, ['identifier'])
+    after = time.perf_counter() - started
+
+    print('{} files x {} headers'.format(args.files, args.columns))
+    print('{:<20} {:>8.3f}s'.format('pandas str chain', before))
+    print('{:<20} {:>8.3f}s'.format('header schema', after))
+
+
+if __name__ == "__main__":
+    main()
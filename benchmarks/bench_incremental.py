@@ -0,0 +1,39 @@
+import os
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import generate_rows, WRITERS
+from PseudoEngine import Pseudonymiser
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a full run against an incremental run after rows are appended")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--appended', type=int, default=10000)
+    parser.add_argument('--columns', type=int, default=10)
+    args = parser.parse_args()
+
+    rows = list(generate_rows(args.rows + args.appended, args.columns))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'growing.' + args.format)
+        WRITERS[args.format](path, rows[:args.rows + 1])
+        first = Pseudonymiser('salt', path, incremental=True).run()
+
+        WRITERS[args.format](path, rows)
+        full = Pseudonymiser('salt', path, output_path=os.path.join(directory, 'full.' + args.format)).run()
+        delta = Pseudonymiser('salt', path, incremental=True).run()
+
+        print('{} rows + {} appended ({})'.format(args.rows, args.appended, args.format))
+        for label, stats in (('first incremental', first), ('full rerun', full), ('incremental rerun', delta)):
+            print('{:<20} {:>8.2f}s {:>8} rows hashed  {}  '.format(
+                label, stats['seconds'], stats['rows'], stats.get('incremental', 'full'))
+                + ' '.join('{} {:.2f}s'.format(k, v) for k, v in stats['phases'].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_file
+from PseudoEngine import Pseudonymiser, pseudo_batch
+from PseudoMapping import MappingTable, MAPPING_FORMATS, mapping_name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of writing a mapping sidecar and of reverse lookups in it")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--columns', type=int, default=5)
+    parser.add_argument('--format', default='csv')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = make_file(directory, args.format, args.rows, args.columns)
+        plain = Pseudonymiser('salt', path).run()
+        print('{} rows ({})'.format(args.rows, args.format))
+        print('{:<10} {:>8.2f}s'.format('no mapping', plain['seconds']))
+        for fmt in MAPPING_FORMATS:
+            mapping = mapping_name(plain['output'], fmt)
+            stats = Pseudonymiser('salt', path, mapping=mapping).run()
+            started = time.perf_counter()
+            table = MappingTable.open(mapping)
+            opened = time.perf_counter() - started
+            digests = pseudo_batch(np.random.permutation(table.all_values()), 'salt')
+            started = time.perf_counter()
+            found = table.values(digests)
+            lookup = time.perf_counter() - started
+            assert all(value is not None for value in found)
+            print('{:<10} {:>8.2f}s  mapping {:.2f}s  {:.1f} MB  open {:.3f}s  {} lookups {:.2f}s'.format(
+                fmt, stats['seconds'], stats['phases']['mapping'], os.path.getsize(mapping) / 1048576,
+                opened, len(digests), lookup))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import sys, json
+sys.path.insert(0, {root!r})
+from PseudoEngine import Pseudonymiser
+stats = Pseudonymiser('salt', {path!r}, 'identifier', streaming={streaming}).run()
+print(json.dumps(stats))
+"""
+
+
+def measure(path, streaming):
+    code = CHILD.format(root=ROOT, path=path, streaming=streaming)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of in-memory and streaming pseudonymisation")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 200000])
+    parser.add_argument('--columns', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print('{:>10} {:>16} {:>16}'.format('rows', 'in-memory MB', 'streaming MB'))
+        for rows in args.rows:
+            path = make_file(directory, 'xlsx', rows, args.columns)
+            frame = measure(path, False)
+            stream = measure(path, True)
+            print('{:>10} {:>16.1f} {:>16.1f}'.format(rows, frame['peak_rss_mb'], stream['peak_rss_mb']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import pem
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PseudoSalt import SaltManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Salt from a chain bundle: pem.parse_file against the salt manager")
+    parser.add_argument('--cert', default=os.path.join(ROOT, 'sample cert.crt'))
+    parser.add_argument('--copies', type=int, default=5000, help="certs in the generated bundle")
+    args = parser.parse_args()
+
+    with open(args.cert, 'rb') as f:
+        cert = f.read()
+    with tempfile.TemporaryDirectory() as directory:
+        bundle = os.path.join(directory, 'bundle.pem')
+        with open(bundle, 'wb') as f:
+            f.write(cert * args.copies)
+        salts = SaltManager()
+        expected, whole = timed(lambda path: pem.parse_file(path)[0].sha1_hexdigest, bundle)
+        first, cold = timed(salts.cert_salt, bundle)
+        again, warm = timed(salts.cert_salt, bundle)
+        assert expected == first == again
+        print('{} certs, {:.1f} MB'.format(args.copies, os.path.getsize(bundle) / 1048576))
+        for label, seconds in (('pem.parse_file', whole), ('first object', cold), ('session cache', warm)):
+            print('{:<16} {:>10.4f}s'.format(label, seconds))
+
+
+if __name__ == "__main__":
+    main()
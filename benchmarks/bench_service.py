@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PseudoService import PseudoService, serve
+
+
+class UnixConnection(http.client.HTTPConnection):
+
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.connect(self.socket_path)
+
+
+def connect(server, socket_path):
+    if socket_path:
+        return UnixConnection(socket_path)
+    return http.client.HTTPConnection(*server.server_address[:2])
+
+
+def client(server, socket_path, requests, body):
+    connection = connect(server, socket_path)
+    for _ in range(requests):
+        connection.request('POST', '/hash', body=body, headers={'Content-Type': 'application/json'})
+        connection.getresponse().read()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests per second and latency of the local service")
+    parser.add_argument('--batch', type=int, default=100, help="identifiers per request")
+    parser.add_argument('--requests', type=int, default=2000, help="requests per client")
+    parser.add_argument('--clients', type=int, default=4, help="concurrent keep-alive connections")
+    parser.add_argument('--workers', type=int, help="hashing processes in the service")
+    parser.add_argument('--socket', metavar='PATH', help="use a Unix socket instead of a port")
+    args = parser.parse_args()
+
+    service = PseudoService({'bench': 'salt'}, workers=args.workers)
+    listening = threading.Event()
+    servers = []
+
+    def ready(server):
+        servers.append(server)
+        listening.set()
+
+    threading.Thread(target=serve, args=(service, '127.0.0.1', 0, args.socket), kwargs={'ready': ready},
+                     daemon=True).start()
+    listening.wait()
+    server = servers[0]
+    body = json.dumps({'values': [str(i) for i in range(args.batch)]})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        for future in [pool.submit(client, server, args.socket, args.requests, body) for _ in range(args.clients)]:
+            future.result()
+    seconds = time.perf_counter() - started
+
+    connection = connect(server, args.socket)
+    connection.request('GET', '/metrics')
+    metrics = json.loads(connection.getresponse().read())
+    total = args.clients * args.requests
+    print('{} clients x {} requests of {} identifiers'.format(args.clients, args.requests, args.batch))
+    print('{:>10.0f} requests/sec {:>12,.0f} identifiers/sec'.format(total / seconds, total * args.batch / seconds))
+    print('latency ms ' + ' '.join('{} {}'.format(k, v) for k, v in metrics['latency_ms'].items()))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import argparse
+import tempfile
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import generate_rows
+from PseudoEngine import Pseudonymiser
+
+
+def write_workbook(path, sheets, rows, columns):
+    book = openpyxl.Workbook(write_only=True)
+    for i in range(sheets):
+        sheet = book.create_sheet('Sheet {}'.format(i + 1))
+        for row in generate_rows(rows, columns, seed=i):
+            sheet.append(row)
+    book.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a multi-sheet workbook with sheets parsed serially and in parallel")
+    parser.add_argument('--sheets', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=50000, help="rows per sheet")
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sheets.xlsx')
+        write_workbook(path, args.sheets, args.rows, args.columns)
+        output = os.path.join(directory, 'output.xlsx')
+
+        # the slowest single sheet is the floor the parallel run can approach
+        single = Pseudonymiser('salt', path, output_path=output, sheets=['Sheet 1']).run()
+        serial = Pseudonymiser('salt', path, output_path=output, sheets='all', workers=1).run()
+        parallel = Pseudonymiser('salt', path, output_path=output, sheets='all', workers=args.workers).run()
+
+        print('{} sheets of {} rows'.format(args.sheets, args.rows))
+        for label, stats in (('one sheet', single), ('serial', serial),
+                             ('parallel ({} workers)'.format(args.workers), parallel)):
+            print('{:<24} {:>8.2f}s  '.format(label, stats['seconds'])
+                  + ' '.join('{} {:.2f}s'.format(k, v) for k, v in stats['phases'].items()))
+
+
+if __name__ == "__main__":
+    main()
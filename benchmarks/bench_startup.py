@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the window should be drawn within this many seconds of launching, packaged or not
+STARTUP_TARGET_SECONDS = 1.0
+# every dialog's title, which a packaged build is watched for from outside
+WINDOW_TITLE = 'Simple Pseudonymiser'
+POLL_SECONDS = 0.01
+
+
+def import_seconds(module):
+    code = 'import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)'.format(module)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+    return float(output.decode('utf-8').strip().splitlines()[-1])
+
+
+# runs a dialog script as __main__ with warm_up wrapped, so the dialogs themselves carry no timing hooks
+CHILD = """
+import sys, time, runpy
+sys.path.insert(0, {root!r})
+import PseudoStartup
+
+warm_up = PseudoStartup.warm_up
+
+
+def timed_warm_up(app, *args, **kwargs):
+    warmed = warm_up(app, *args, **kwargs)
+
+    def shown():
+        app.update_idletasks()
+        print('shown', repr(time.time()), flush=True)
+        app.after(PseudoStartup.POLL_MS, wait)
+
+    def wait():
+        if not warmed.is_set():
+            app.after(PseudoStartup.POLL_MS, wait)
+            return
+        print('warm', repr(time.time()), flush=True)
+        app.destroy()
+
+    app.after_idle(shown)
+    return warmed
+
+
+PseudoStartup.warm_up = timed_warm_up
+runpy.run_path({script!r}, run_name='__main__')
+"""
+
+
+def launch(script, timeout):
+    """
+    Runs the dialog and returns seconds from launch to the window being drawn
+    and to the heavy imports being warm, or None when the app never drew a
+    window (no display, or it failed to start).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.time()
+        result = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT, script=script)], cwd=directory,
+                                timeout=timeout, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    marks = dict(line.split() for line in result.stdout.decode('utf-8').splitlines() if line.strip())
+    if 'shown' not in marks or 'warm' not in marks:
+        return None
+    return {event: float(at) - started for event, at in marks.items()}
+
+
+def window_shown(title):
+    """
+    Whether a visible top level window with this title is on screen, or None
+    when there is no way to tell here (xdotool is needed outside Windows).
+    """
+    if sys.platform == 'win32':
+        import ctypes
+        window = ctypes.windll.user32.FindWindowW(None, title)
+        return bool(window) and bool(ctypes.windll.user32.IsWindowVisible(window))
+    try:
+        result = subprocess.run(['xdotool', 'search', '--onlyvisible', '--name', '^{}$'.format(title)],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        return None
+    return bool(result.stdout.strip())
+
+
+def stop(process):
+    # a --onefile build runs the app in a child of the bootloader, so the whole tree is stopped
+    if sys.platform == 'win32':
+        subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        os.killpg(process.pid, signal.SIGTERM)
+    process.wait()
+
+
+def launch_packaged(exe, timeout, title=WINDOW_TITLE):
+    """
+    Runs a packaged build and returns seconds from launch until its window is
+    on screen, found by polling for the dialog's title as the build has no
+    timing hooks inside it, or None when no window could be seen. When the
+    imports are warm cannot be seen from outside.
+    """
+    if window_shown(title) is not False:
+        return None
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.time()
+        process = subprocess.Popen([exe], cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   start_new_session=sys.platform != 'win32')
+        try:
+            while time.time() - started < timeout and process.poll() is None:
+                if window_shown(title):
+                    return {'shown': time.time() - started}
+                time.sleep(POLL_SECONDS)
+            return None
+        finally:
+            if process.poll() is None:
+                stop(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from launch until the dialog window is drawn")
+    parser.add_argument('--script', default='PseudoDialog.py', help="dialog script run with this interpreter")
+    parser.add_argument('--exe', help="packaged build to time as well, e.g. dist/PseudoDialog/PseudoDialog.exe")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--target', type=float, default=STARTUP_TARGET_SECONDS)
+    args = parser.parse_args()
+
+    module = os.path.splitext(os.path.basename(args.script))[0]
+    print('{:<28} {:>8.3f}s'.format('import ' + module, import_seconds(module)))
+    print('{:<28} {:>8.3f}s'.format('import PseudoEngine', import_seconds('PseudoEngine')))
+
+    launches = [(module, lambda: launch(os.path.join(ROOT, args.script), args.timeout))]
+    if args.exe:
+        exe = os.path.abspath(args.exe)
+        launches.append(('packaged', lambda: launch_packaged(exe, args.timeout)))
+    missed = False
+    for label, run_once in launches:
+        runs = [run_once() for _ in range(args.runs)]
+        if any(run is None for run in runs):
+            print('{:<28} no window was seen (is there a display, and xdotool outside Windows? '
+                  'is the app already open?)'.format(label))
+            continue
+        shown = statistics.median(run['shown'] for run in runs)
+        warm = '{:>6.2f}s'.format(statistics.median(run['warm'] for run in runs)) if 'warm' in runs[0] else '   n/a '
+        missed = missed or shown > args.target
+        print('{:<28} shown {:>6.2f}s  warm {}  target {:.2f}s {}'.format(
+            label, shown, warm, args.target, 'ok' if shown <= args.target else 'MISSED'))
+    return 1 if missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
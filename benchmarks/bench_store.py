@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PseudoEngine import pseudo_batch
+from PseudoCache import DigestStore
+
+
+def timed_digests(store, values, salt):
+    started = time.perf_counter()
+    digests = store.digests(values, lambda missing: pseudo_batch(missing, salt))
+    return digests, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold and warm runs through the persistent digest store")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--new', type=float, default=0.05, help="share of new identifiers in the warm run")
+    parser.add_argument('--salt', default='2fd4e1c67a2d28fced849ee1bb76e7391b93eb12')
+    args = parser.parse_args()
+
+    cohort = ['{:010d}'.format(i * 7919) for i in range(args.rows)]
+    new_rows = int(args.rows * args.new)
+    next_month = cohort[new_rows:] + ['{:010d}'.format(i * 7919 + 1) for i in range(new_rows)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'digests.sqlite')
+
+        started = time.perf_counter()
+        plain = pseudo_batch(next_month, args.salt)
+        plain_seconds = time.perf_counter() - started
+
+        store = DigestStore(path, args.salt)
+        cold, cold_seconds = timed_digests(store, cohort, args.salt)
+        store.close()
+
+        store = DigestStore(path, args.salt)
+        warm, warm_seconds = timed_digests(store, next_month, args.salt)
+        # a second file through the same connection no longer pays for the bulk load
+        again, again_seconds = timed_digests(store, next_month, args.salt)
+        store.close()
+
+        if list(warm) != list(plain) or list(again) != list(plain):
+            sys.exit('stored digests differ from pseudo_batch()')
+
+        print('rows              {}'.format(args.rows))
+        print('no store          {:>12,.0f} rows/sec'.format(args.rows / plain_seconds))
+        print('cold store        {:>12,.0f} rows/sec'.format(args.rows / cold_seconds))
+        print('warm store        {:>12,.0f} rows/sec ({:.0%} new)'.format(args.rows / warm_seconds, args.new))
+        print('warm, loaded      {:>12,.0f} rows/sec'.format(args.rows / again_seconds))
+
+
+if __name__ == "__main__":
+    main()
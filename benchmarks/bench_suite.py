@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# an xlsx sheet holds 1,048,576 rows, the header included
+XLSX_MAX_ROWS = 1048575
+
+PRESETS = {
+    'smoke': {'rows': [2000], 'columns': [5], 'cardinality': [None, 100], 'length': [10]},
+    'quick': {'rows': [10000, 100000], 'columns': [10], 'cardinality': [None, 1000], 'length': [10]},
+    'full': {'rows': [10000, 100000, 1000000, 5000000], 'columns': [5, 30], 'cardinality': [None, 1000],
+             'length': [10, 40]},
+}
+
+# each case runs in its own process so peak RSS belongs to that case alone
+CHILD = """
+import sys, json
+sys.path.insert(0, {root!r})
+from PseudoEngine import Pseudonymiser
+from PseudoCache import DigestCache
+cache = DigestCache() if {cache!r} else None
+stats = Pseudonymiser('2fd4e1c67a2d28fced849ee1bb76e7391b93eb12', {path!r}, 'identifier',
+                      output_path={output!r}, streaming={streaming!r}, cache=cache).run()
+print(json.dumps(stats, default=str))
+"""
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(path, directory, streaming, cache):
+    output = os.path.join(directory, 'output' + os.path.splitext(path)[1])
+    code = CHILD.format(root=ROOT, path=path, output=output, streaming=streaming, cache=cache)
+    result = subprocess.check_output([sys.executable, '-c', code])
+    stats = json.loads(result.decode('utf-8').strip().splitlines()[-1])
+    os.remove(output)
+    return stats
+
+
+def cases(preset, formats, modes):
+    for fmt in formats:
+        for rows in preset['rows']:
+            for columns in preset['columns']:
+                for cardinality in preset['cardinality']:
+                    for length in preset['length']:
+                        for mode in modes:
+                            if mode == 'streaming' and fmt != 'xlsx':
+                                continue
+                            # more rows than a sheet holds is not a workbook anyone could have
+                            if fmt == 'xlsx' and rows > XLSX_MAX_ROWS:
+                                continue
+                            yield {'format': fmt, 'rows': rows, 'columns': columns,
+                                   'cardinality': cardinality, 'length': length, 'mode': mode}
+
+
+def case_key(case):
+    return '{format}/{rows}r/{columns}c/{cardinality}u/{length}l/{mode}'.format(**case)
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Returns the cases whose rows/sec fell, or whose peak memory rose, by more
+    than tolerance against the baseline results file.
+    """
+    with open(baseline_path) as f:
+        baseline = {case_key(r['case']): r['stats'] for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        before = baseline.get(case_key(result['case']))
+        if before is None:
+            continue
+        after = result['stats']
+        if after['rows_per_sec'] < before['rows_per_sec'] * (1 - tolerance):
+            regressions.append((case_key(result['case']), 'rows_per_sec', before['rows_per_sec'],
+                                after['rows_per_sec']))
+        if before.get('peak_rss_mb') and after['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance):
+            regressions.append((case_key(result['case']), 'peak_rss_mb', before['peak_rss_mb'],
+                                after['peak_rss_mb']))
+    return regressions
+
+
+def run_cases(args, data_dir, results):
+    with tempfile.TemporaryDirectory() as work_dir:
+        for case in cases(PRESETS[args.preset], args.formats, args.modes):
+            started = time.perf_counter()
+            path = make_file(data_dir, case['format'], case['rows'], case['columns'],
+                             case['cardinality'], case['length'])
+            generate_seconds = time.perf_counter() - started
+            stats = run_case(path, work_dir, case['mode'] == 'streaming', case['mode'] == 'cached')
+            stats['generate_seconds'] = round(generate_seconds, 4)
+            results.append({'case': case, 'stats': stats})
+            print('{:<40} {:>12,.0f} rows/sec {:>8.1f} MB  {}'.format(
+                case_key(case), stats['rows_per_sec'], stats['peak_rss_mb'] or 0,
+                ' '.join('{} {:.2f}s'.format(k, v) for k, v in stats['phases'].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pseudonymisation pipeline on synthetic files")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick')
+    parser.add_argument('--formats', nargs='+', default=['xlsx', 'csv'])
+    parser.add_argument('--modes', nargs='+', default=['frame', 'streaming', 'cached'],
+                        choices=['frame', 'streaming', 'cached'])
+    parser.add_argument('--data-dir', help="keep generated files here between runs")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    args = parser.parse_args()
+
+    # generated files are only kept when --data-dir names where
+    generated = None if args.data_dir else tempfile.TemporaryDirectory(prefix='pseudo_bench_')
+    data_dir = args.data_dir or generated.name
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    try:
+        run_cases(args, data_dir, results)
+    finally:
+        if generated is not None:
+            generated.cleanup()
+
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+              'preset': args.preset, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print('Results written to ' + args.output)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for key, metric, before, after in regressions:
+            print('REGRESSION {} {}: {} -> {}'.format(key, metric, before, after), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PseudoFormats import EXCEL_WRITERS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# each writer runs in its own process so peak RSS belongs to that writer alone
+CHILD = """
+import sys, json, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {root!r} + '/benchmarks')
+import pandas as pd
+from synthetic import generate_rows
+from PseudoFormats import write_excel
+from PseudoMetrics import peak_rss_mb
+rows = generate_rows({rows}, {columns})
+df = pd.DataFrame(list(rows)[1:]).astype(str)
+df.columns = ['identifier'] + ['Column {{}}'.format(i) for i in range(1, {columns})]
+started = time.perf_counter()
+write_excel({{'Sheet1': df}}, {path!r}, {writer!r})
+print(json.dumps({{'seconds': time.perf_counter() - started, 'peak_rss_mb': peak_rss_mb()}}))
+"""
+
+
+def measure(writer, rows, columns, path):
+    code = CHILD.format(root=ROOT, rows=rows, columns=columns, path=path, writer=writer)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write throughput of each xlsx writer backend")
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--columns', type=int, default=30)
+    parser.add_argument('--writers', nargs='+', default=sorted(EXCEL_WRITERS), choices=sorted(EXCEL_WRITERS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print('{} rows x {} columns'.format(args.rows, args.columns))
+        print('{:<12} {:>10} {:>14} {:>12} {:>10}'.format('writer', 'seconds', 'rows/sec', 'peak MB', 'file MB'))
+        for writer in args.writers:
+            path = os.path.join(directory, writer + '.xlsx')
+            result = measure(writer, args.rows, args.columns, path)
+            print('{:<12} {:>10.2f} {:>14,.0f} {:>12.1f} {:>10.1f}'.format(
+                writer, result['seconds'], args.rows / result['seconds'], result['peak_rss_mb'] or 0,
+                os.path.getsize(path) / 1048576))
+
+
+if __name__ == "__main__":
+    main()
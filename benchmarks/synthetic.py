@@ -0,0 +1,78 @@
+import os
+import csv
+import random
+import string
+import argparse
+import openpyxl
+
+
+def identifier(rng, length):
+    return ''.join(rng.choice(string.digits) for _ in range(length))
+
+
+def generate_rows(rows, columns=10, cardinality=None, length=10, seed=0):
+    """
+    Yields a header and then rows with an 'identifier' column drawn from
+    cardinality distinct values (every row distinct when None), followed by
+    filler text, integer and float columns. The same arguments always give
+    the same data.
+    """
+    rng = random.Random(seed)
+    pool = [identifier(rng, length) for _ in range(cardinality)] if cardinality else None
+    yield ['identifier'] + ['Column {}'.format(i) for i in range(1, columns)]
+    for i in range(rows):
+        value = rng.choice(pool) if pool else '{:0{}d}'.format(i, length)
+        filler = []
+        for c in range(1, columns):
+            kind = c % 3
+            if kind == 0:
+                filler.append(rng.randint(0, 100000))
+            elif kind == 1:
+                filler.append('text {} {}'.format(i, c))
+            else:
+                filler.append(round(rng.random() * 1000, 3))
+        yield [value] + filler
+
+
+def write_xlsx(path, rows):
+    book = openpyxl.Workbook(write_only=True)
+    sheet = book.create_sheet()
+    for row in rows:
+        sheet.append(row)
+    book.save(path)
+
+
+def write_csv(path, rows, delimiter=','):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerows(rows)
+
+
+WRITERS = {'xlsx': write_xlsx, 'csv': write_csv,
+           'tsv': lambda path, rows: write_csv(path, rows, delimiter='\t')}
+
+
+def make_file(directory, fmt, rows, columns=10, cardinality=None, length=10, seed=0):
+    name = 'synthetic_{}r_{}c_{}u_{}l.{}'.format(rows, columns, cardinality or 'all', length, fmt)
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        WRITERS[fmt](path, generate_rows(rows, columns, cardinality, length, seed))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic workbook for benchmarking")
+    parser.add_argument('directory')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='xlsx')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--cardinality', type=int, help="distinct identifiers (default every row distinct)")
+    parser.add_argument('--length', type=int, default=10, help="identifier length")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(args.directory, exist_ok=True)
+    print(make_file(args.directory, args.format, args.rows, args.columns, args.cardinality, args.length, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import logging
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SALT = '2fd4e1c67a2d28fced849ee1bb76e7391b93eb12'
+
+
+def write_workbook(path, sheets):
+    """
+    Writes {sheet title: rows} with openpyxl, the first row of each being its headers.
+    """
+    book = openpyxl.Workbook()
+    book.remove(book.active)
+    for title, rows in sheets.items():
+        sheet = book.create_sheet(title)
+        for row in rows:
+            sheet.append(row)
+    book.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def salt():
+    return SALT
+
+
+@pytest.fixture
+def cert():
+    return os.path.join(ROOT, 'sample cert.crt')
+
+
+@pytest.fixture(autouse=True)
+def root_handlers():
+    # the CLI adds its rotating log to the root logger, which must not outlive a test
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    for handler in root.handlers[:]:
+        if handler not in handlers:
+            root.removeHandler(handler)
+            handler.close()
+    root.setLevel(level)
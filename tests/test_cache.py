@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+from PseudoEngine import Hasher, Pseudonymiser, pseudo
+from PseudoCache import DigestCache, DigestStore
+
+
+class CountingHasher:
+    def __init__(self, salt):
+        self.hasher = Hasher(salt)
+        self.calls = []
+
+    def __call__(self, values):
+        self.calls.append(list(values))
+        return self.hasher.batch(values)
+
+
+def test_cache_hashes_each_distinct_value_once(salt):
+    cache = DigestCache(max_size=2)
+    hasher = CountingHasher(salt)
+    assert list(cache.digests(['a', 'b', 'a'], salt, hasher)) == [pseudo(x, salt) for x in 'aba']
+    assert hasher.calls == [['a', 'b']]
+
+    # 'a' is found and becomes the newest entry, so 'c' evicts 'b'
+    assert list(cache.digests(['a', 'c'], salt, hasher)) == [pseudo(x, salt) for x in 'ac']
+    assert hasher.calls[-1] == ['c']
+    assert cache.stats() == {'cache_rows': 5, 'cache_hits': 1, 'cache_misses': 3, 'cache_evictions': 1,
+                             'cache_size': 2}
+    cache.digests(['b'], salt, hasher)
+    assert hasher.calls[-1] == ['b']
+
+
+def test_cache_keeps_salts_apart(salt):
+    cache = DigestCache()
+    cache.digests(['a'], salt, CountingHasher(salt))
+    other = CountingHasher(salt + 'other')
+    assert list(cache.digests(['a'], salt + 'other', other)) == [pseudo('a', salt + 'other')]
+    assert other.calls == [['a']]
+
+
+def test_runs_share_a_cache(salt, tmp_path):
+    cache = DigestCache()
+    for name in ('one.csv', 'two.csv'):
+        (tmp_path / name).write_text('identifier\na\nb\na\n')
+    first = Pseudonymiser(salt, tmp_path / 'one.csv', cache=cache).run()
+    second = Pseudonymiser(salt, tmp_path / 'two.csv', cache=cache).run()
+    assert (first['cache_misses'], second['cache_hits'], second['cache_misses']) == (2, 2, 2)
+    digests = pd.read_csv(second['output'], dtype='str')['DIGEST'].tolist()
+    assert digests == [pseudo(x, salt) for x in 'aba']
+
+
+def test_store_serves_digests_across_connections(salt, tmp_path):
+    path = str(tmp_path / 'digests.sqlite')
+    store = DigestStore(path, salt)
+    store.digests(['a', 'b'], CountingHasher(salt))
+    store.close()
+
+    store = DigestStore(path, salt)
+    hasher = CountingHasher(salt)
+    assert list(store.digests(['a', 'c'], hasher)) == [pseudo(x, salt) for x in 'ac']
+    assert hasher.calls == [['c']]
+    assert (len(store), store.stats()) == (3, {'store_hits': 1, 'store_misses': 1})
+    store.close()
+
+
+@pytest.mark.parametrize('scope', [lambda salt: salt + 'other', lambda salt: Hasher(salt, 'keyed').scope])
+def test_store_is_emptied_for_another_salt_or_scheme(salt, tmp_path, scope):
+    path = str(tmp_path / 'digests.sqlite')
+    store = DigestStore(path, salt)
+    store.digests(['a'], CountingHasher(salt))
+    store.close()
+
+    store = DigestStore(path, scope(salt))
+    assert len(store) == 0
+    hasher = CountingHasher(salt)
+    store.digests(['a'], hasher)
+    assert hasher.calls == [['a']]
+    store.close()
+
+    # and the next connection with the first salt starts empty again
+    store = DigestStore(path, salt)
+    assert len(store) == 0
+    store.close()
+
+
+def test_runs_refuse_a_store_of_another_salt(salt, tmp_path):
+    (tmp_path / 'data.csv').write_text('identifier\na\n')
+    store = DigestStore(str(tmp_path / 'digests.sqlite'), salt)
+    with pytest.raises(ValueError):
+        Pseudonymiser(salt, tmp_path / 'data.csv', hasher=Hasher(salt, 'keyed'), store=store)
+    store.close()
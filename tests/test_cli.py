@@ -0,0 +1,52 @@
+import os
+import json
+import multiprocessing
+import pytest
+from PseudoCli import main, expand_inputs
+
+
+def test_bad_cert_is_an_argument_error(tmp_path, capsys):
+    cert = tmp_path / 'bad.crt'
+    cert.write_text('not a cert\n')
+    data = tmp_path / 'data.csv'
+    data.write_text('identifier\n1\n')
+    log = str(tmp_path / 'pseudo.log')
+    assert main(['run', '--cert', str(cert), str(data), '--log', log]) == 2
+    assert main(['run', '--cert', str(tmp_path / 'missing.crt'), str(data), '--log', log]) == 2
+    assert 'No PEM object' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('method', ['fork', 'spawn'])
+def test_worker_metrics_reach_the_log(tmp_path, cert, method):
+    if method not in multiprocessing.get_all_start_methods():
+        pytest.skip('no {} start method here'.format(method))
+    for name in ('a', 'b'):
+        (tmp_path / '{}.csv'.format(name)).write_text('identifier,x\n1,2\n3,4\n')
+    log = tmp_path / 'pseudo.log'
+    previous = multiprocessing.get_start_method()
+    multiprocessing.set_start_method(method, force=True)
+    try:
+        assert main(['run', '--cert', cert, str(tmp_path), '--jobs', '2', '--log', str(log)]) == 0
+    finally:
+        multiprocessing.set_start_method(previous, force=True)
+    records = [json.loads(line.split('INFO', 1)[1]) for line in log.read_text().splitlines()
+               if 'pseudo.metrics' in line]
+    assert sorted(os.path.basename(record['input']) for record in records) == ['a.csv', 'b.csv']
+
+
+def test_mapping_sidecars_are_not_inputs(tmp_path, cert):
+    (tmp_path / 'data.csv').write_text('identifier\n1\n2\n')
+    log = str(tmp_path / 'pseudo.log')
+    for fmt in ('parquet', 'binary'):
+        assert main(['run', '--cert', cert, str(tmp_path), '--mapping', fmt, '--log', log]) == 0
+    (tmp_path / 'data_psuedo.mapping.parquet.tmp').write_text('')
+    assert os.path.exists(tmp_path / 'data_psuedo.mapping.parquet')
+    assert expand_inputs([str(tmp_path)]) == [str(tmp_path / 'data.csv')]
+    assert expand_inputs([str(tmp_path / '*')]) == [str(tmp_path / 'data.csv')]
+
+
+def test_leftovers_of_an_interrupted_run_are_not_inputs(tmp_path):
+    for name in ('data.csv', 'data_psuedo.partial.csv', 'data_psuedo.csv.manifest.json',
+                 'data_psuedo.csv.checkpoint.json', 'report.partial.csv'):
+        (tmp_path / name).write_text('identifier\n1\n')
+    assert expand_inputs([str(tmp_path)]) == [str(tmp_path / 'data.csv'), str(tmp_path / 'report.partial.csv')]
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from conftest import write_workbook
+from PseudoEngine import Hasher, Pseudonymiser, MissingColumnError, pseudo, pseudo_batch, pseudo_parallel
+from PseudoColumns import text_array, digest_series
+
+VALUES = ['a', 'Ünïcode', '12', '1.5', 'x,y', 'has "quotes"', 'tab\there', ' padded ', 'a']
+
+
+def baseline(values, salt):
+    # what the original dialog wrote: pseudo() applied value by value
+    return [pseudo(x, salt) for x in values]
+
+
+@pytest.mark.parametrize('hasher_options', [{}, {'mode': 'keyed'},
+                                            {'mode': 'keyed', 'algorithm': 'blake2b', 'digest_size': 16,
+                                             'encoding': 'base64'}])
+def test_batches_match_one_value_at_a_time(salt, hasher_options):
+    hasher = Hasher(salt, **hasher_options)
+    expected = [hasher.pseudo(x) for x in VALUES]
+    assert list(hasher.batch(VALUES)) == expected
+    assert hasher.fixed_batch(text_array(VALUES)).astype(str).tolist() == expected
+    assert list(pseudo_parallel(VALUES, hasher, workers=1)) == expected
+    if not hasher_options:
+        assert expected == baseline(VALUES, salt)
+        assert list(pseudo_batch(VALUES, salt)) == expected
+
+
+def test_missing_values_hash_as_nan(salt):
+    values = pd.Series(['a', None, 'b'], dtype='str')
+    assert Hasher(salt).fixed_batch(text_array(values)).astype(str).tolist() == baseline(['a', 'nan', 'b'], salt)
+
+
+def test_text_and_digest_columns_stay_in_arrow(salt, tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('identifier\na\nb\n')
+    column = pd.read_csv(path, dtype='str')['identifier']
+    digests = digest_series(Hasher(salt).fixed_batch(text_array(column)))
+    for series in (column, digests):
+        assert isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'pyarrow'
+
+
+@pytest.mark.parametrize('passthrough', [False, True])
+def test_csv_output_matches_baseline(salt, tmp_path, passthrough):
+    path = tmp_path / 'data.csv'
+    pd.DataFrame({'identifier': VALUES, 'age': range(len(VALUES))}).to_csv(path, index=False)
+    stats = Pseudonymiser(salt, path, passthrough=passthrough).run()
+    out = pd.read_csv(stats['output'], dtype='str')
+    assert list(out.columns) == ['age', 'DIGEST']
+    assert out['DIGEST'].tolist() == baseline(pd.read_csv(path, dtype='str')['identifier'], salt)
+
+
+def test_csv_empty_cells_match_baseline(salt, tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('identifier,age\na,1\n,2\nb,3\n')
+    stats = Pseudonymiser(salt, path).run()
+    assert pd.read_csv(stats['output'], dtype='str')['DIGEST'].tolist() == baseline(['a', 'nan', 'b'], salt)
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('excel_writer', ['pandas', 'openpyxl', 'xlsxwriter'])
+def test_xlsx_output_matches_baseline(salt, tmp_path, streaming, excel_writer):
+    path = write_workbook(tmp_path / 'data.xlsx', {'Data': [['identifier', 'age']] +
+                                                   [[value, i] for i, value in enumerate(VALUES)] +
+                                                   [[12, 1], [1.5, 2], [None, 3]]})
+    stats = Pseudonymiser(salt, path, streaming=streaming, excel_writer=excel_writer).run()
+    out = pd.read_excel(stats['output'], dtype='str')
+    assert 'identifier' not in out.columns
+    assert out['DIGEST'].tolist() == baseline(pd.read_excel(path, dtype='str')['identifier'], salt)
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.xlsx'])
+def test_several_columns_get_a_digest_each(salt, tmp_path, extension):
+    df = pd.DataFrame({'identifier': ['a', 'b'], 'age': ['1', '2'], 'nhs': ['n1', 'n2']})
+    path = str(tmp_path / ('data' + extension))
+    if extension == '.csv':
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+    stats = Pseudonymiser(salt, path, ['identifier', 'nhs']).run()
+    read = pd.read_csv if extension == '.csv' else pd.read_excel
+    out = read(stats['output'], dtype='str')
+    assert list(out.columns) == ['age', 'DIGEST_identifier', 'DIGEST_nhs']
+    assert out['DIGEST_identifier'].tolist() == baseline(['a', 'b'], salt)
+    assert out['DIGEST_nhs'].tolist() == baseline(['n1', 'n2'], salt)
+    with pytest.raises(MissingColumnError):
+        Pseudonymiser(salt, path, ['identifier', 'missing']).run()
+
+
+def test_parquet_output_matches_baseline(salt, tmp_path):
+    path = str(tmp_path / 'data.parquet')
+    pq.write_table(pa.table({'identifier': VALUES, 'age': np.arange(len(VALUES))}), path)
+    stats = Pseudonymiser(salt, path).run()
+    out = pq.read_table(stats['output'])
+    assert out.column_names == ['age', 'DIGEST']
+    assert out.column('DIGEST').to_pylist() == baseline(VALUES, salt)
+
+
+def test_a_run_hashes_every_chunk_on_one_pool(salt, tmp_path, monkeypatch):
+    import PseudoEngine
+    import PseudoFormats
+
+    pools = []
+
+    class CountedPool(PseudoEngine.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+
+    monkeypatch.setattr(PseudoEngine, 'ProcessPoolExecutor', CountedPool)
+    monkeypatch.setattr(PseudoEngine, 'PARALLEL_MIN_ROWS', 10)
+    monkeypatch.setattr(PseudoFormats, 'CSV_CHUNK_ROWS', 20)
+    path = tmp_path / 'data.csv'
+    pd.DataFrame({'identifier': ['id{}'.format(i) for i in range(100)]}).to_csv(path, index=False)
+    stats = Pseudonymiser(salt, path, workers=2).run()
+    assert len(pools) == 1
+    assert pools[0]._shutdown_thread
+    out = pd.read_csv(stats['output'], dtype='str')
+    assert out['DIGEST'].tolist() == baseline(['id{}'.format(i) for i in range(100)], salt)
@@ -0,0 +1,49 @@
+import openpyxl
+import pandas as pd
+import pytest
+import PseudoFormats
+from PseudoFormats import EXCEL_WRITERS
+from PseudoEngine import Pseudonymiser, pseudo
+from conftest import write_workbook
+
+NA_CELLS = ['null', 'NA', 'N/A', 'None', 'NULL', '#N/A', 'nan', '']
+
+
+def test_streamed_na_cells_match_frame_digests(tmp_path, salt):
+    rows = [['identifier', 'other']] + [[value, i] for i, value in enumerate(NA_CELLS + ['x', ' NA', 5])]
+    path = write_workbook(tmp_path / 'na.xlsx', {'Sheet1': rows})
+    frame = Pseudonymiser(salt, path, output_path=str(tmp_path / 'frame.xlsx')).run()
+    streamed = Pseudonymiser(salt, path, output_path=str(tmp_path / 'streamed.xlsx'), streaming=True).run()
+    assert frame['rows'] == streamed['rows'] == len(rows) - 1
+
+    frame_digests = pd.read_excel(tmp_path / 'frame.xlsx', dtype='str')['DIGEST'].tolist()
+    streamed_digests = pd.read_excel(tmp_path / 'streamed.xlsx', dtype='str')['DIGEST'].tolist()
+    assert streamed_digests == frame_digests
+    assert frame_digests[0] == pseudo('nan', salt)
+    assert frame_digests[-3:] == [pseudo('x', salt), pseudo(' NA', salt), pseudo('5', salt)]
+
+
+@pytest.mark.parametrize('writer', ['openpyxl', 'xlsxwriter'])
+def test_writers_keep_formula_text_as_text(tmp_path, writer):
+    pytest.importorskip(writer)
+    path = tmp_path / 'out.xlsx'
+    book = EXCEL_WRITERS[writer](str(path))
+    append = book.add_sheet('Sheet1')
+    append(['value', 'n'])
+    append(['=HYPERLINK("http://example.com")', 1])
+    book.close()
+    cell = openpyxl.load_workbook(path).active['A2']
+    assert (cell.value, cell.data_type) == ('=HYPERLINK("http://example.com")', 's')
+
+
+@pytest.mark.parametrize('writer', ['openpyxl', 'xlsxwriter'])
+def test_writers_stop_at_the_sheet_row_limit(tmp_path, writer, monkeypatch):
+    pytest.importorskip(writer)
+    monkeypatch.setattr(PseudoFormats, 'XLSX_MAX_ROWS', 3)
+    book = EXCEL_WRITERS[writer](str(tmp_path / 'out.xlsx'))
+    append = book.add_sheet('Data')
+    for row in range(3):
+        append([row])
+    with pytest.raises(ValueError, match="Sheet 'Data' is full"):
+        append([3])
+    book.close()
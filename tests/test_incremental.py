@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+from conftest import write_workbook
+from PseudoEngine import Pseudonymiser
+
+
+def csv_rows(path, start, stop):
+    with open(path, 'a') as f:
+        for i in range(start, stop):
+            f.write('id{},{}\n'.format(i, i % 90))
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def grown_csv(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('identifier,age\n')
+    csv_rows(path, 0, 50)
+    return path
+
+
+@pytest.mark.parametrize('passthrough', [False, True])
+def test_csv_appends_new_rows_as_a_full_run_would_write_them(salt, tmp_path, grown_csv, passthrough):
+    first = Pseudonymiser(salt, grown_csv, incremental=True, passthrough=passthrough).run()
+    assert first['incremental'] == 'rebuild'
+    csv_rows(grown_csv, 50, 80)
+    second = Pseudonymiser(salt, grown_csv, incremental=True, passthrough=passthrough).run()
+    assert (second['incremental'], second['rows'], second['output_rows']) == ('append', 30, 80)
+    full = Pseudonymiser(salt, grown_csv, output_path=str(tmp_path / 'full.csv'), passthrough=passthrough).run()
+    assert read_bytes(second['output']) == read_bytes(full['output'])
+
+    third = Pseudonymiser(salt, grown_csv, incremental=True, passthrough=passthrough).run()
+    assert (third['incremental'], third['rows'], third['output_rows']) == ('unchanged', 0, 80)
+
+
+def test_csv_rebuilds_when_earlier_rows_change(salt, tmp_path, grown_csv):
+    Pseudonymiser(salt, grown_csv, incremental=True).run()
+    grown_csv.write_text(grown_csv.read_text().replace('id3,', 'id3x,'))
+    stats = Pseudonymiser(salt, grown_csv, incremental=True).run()
+    assert (stats['incremental'], stats['rows']) == ('rebuild', 50)
+    full = Pseudonymiser(salt, grown_csv, output_path=str(tmp_path / 'full.csv')).run()
+    assert read_bytes(stats['output']) == read_bytes(full['output'])
+
+
+def test_csv_rebuilds_when_the_settings_change(salt, grown_csv):
+    Pseudonymiser(salt, grown_csv, incremental=True).run()
+    csv_rows(grown_csv, 50, 60)
+    stats = Pseudonymiser(salt + 'other', grown_csv, incremental=True).run()
+    assert (stats['incremental'], stats['rows']) == ('rebuild', 60)
+
+
+def test_xlsx_appends_and_rebuilds(salt, tmp_path):
+    rows = [['identifier', 'age']] + [['id{}'.format(i), i] for i in range(20)]
+    path = write_workbook(tmp_path / 'data.xlsx', {'Data': rows})
+    assert Pseudonymiser(salt, path, incremental=True).run()['incremental'] == 'rebuild'
+
+    rows += [['id{}'.format(i), i] for i in range(20, 25)]
+    write_workbook(path, {'Data': rows})
+    stats = Pseudonymiser(salt, path, incremental=True).run()
+    assert (stats['incremental'], stats['rows'], stats['output_rows']) == ('append', 5, 25)
+    full = Pseudonymiser(salt, path, output_path=str(tmp_path / 'full.xlsx')).run()
+    pd.testing.assert_frame_equal(pd.read_excel(stats['output'], dtype='str'),
+                                  pd.read_excel(full['output'], dtype='str'))
+
+    rows[1] = ['changed', 0]
+    write_workbook(path, {'Data': rows})
+    stats = Pseudonymiser(salt, path, incremental=True).run()
+    assert (stats['incremental'], stats['rows']) == ('rebuild', 25)
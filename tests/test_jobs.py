@@ -0,0 +1,45 @@
+import queue
+import threading
+from PseudoJobs import JobQueue
+
+
+class Widget:
+    # stands in for a Tk widget; nothing here needs the event loop
+    def after(self, ms, callback):
+        pass
+
+
+def drain(jobs):
+    events = []
+    while True:
+        try:
+            events.append(jobs.events.get_nowait())
+        except queue.Empty:
+            return events
+
+
+def test_jobs_submitted_as_the_worker_stops_still_run():
+    jobs = JobQueue(Widget(), lambda event: None)
+    done = []
+    for i in range(500):
+        finished = threading.Event()
+
+        def run(progress, cancel, i=i, finished=finished):
+            done.append(i)
+            finished.set()
+            return {'rows': 0}
+        jobs.submit('job{}'.format(i), run)
+        assert finished.wait(5), 'job {} was never run'.format(i)
+    assert done == list(range(500))
+
+
+def test_busy_until_the_last_job_has_run():
+    jobs = JobQueue(Widget(), lambda event: None)
+    release = threading.Event()
+    jobs.submit('a', lambda progress, cancel: release.wait(5))
+    jobs.submit('b', lambda progress, cancel: None)
+    assert jobs.busy()
+    release.set()
+    jobs.worker.join(5)
+    assert not jobs.busy()
+    assert [event['type'] for event in drain(jobs)] == ['started', 'done', 'started', 'done', 'idle']
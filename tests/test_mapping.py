@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from PseudoEngine import Hasher, Pseudonymiser
+from PseudoMapping import MappingTable, PREFIX_LOOKUPS, write_mapping
+
+EXTENSIONS = ['.mapping.parquet', '.mapping.bin']
+
+
+def identifiers(count):
+    return ['id{}'.format(i % (count // 2 or 1)) for i in range(count)] + ['Ünïcode', '']
+
+
+@pytest.mark.parametrize('extension', EXTENSIONS)
+def test_csv_digests_look_up_their_values(salt, tmp_path, extension):
+    path = tmp_path / 'data.csv'
+    pd.DataFrame({'identifier': identifiers(40), 'age': range(42)}).to_csv(path, index=False)
+    mapping = str(tmp_path / ('data' + extension))
+    stats = Pseudonymiser(salt, path, mapping=mapping).run()
+    source = pd.read_csv(path, dtype='str')['identifier'].fillna('nan')
+    assert stats['mapping_rows'] == source.nunique()
+
+    digests = pd.read_csv(stats['output'], dtype='str')['DIGEST'].tolist()
+    table = MappingTable.open(mapping)
+    assert len(table) == source.nunique()
+    assert table.values(digests).tolist() == source.tolist()
+    assert table.lookup(digests[0]) == source[0]
+    assert table.lookup('0' * 64) is None
+    assert table.lookup('short') is None
+    assert table.settings['salt_fingerprint']
+
+
+@pytest.mark.parametrize('extension', EXTENSIONS)
+def test_raw_parquet_digests_look_up_their_values(salt, tmp_path, extension):
+    path = str(tmp_path / 'data.parquet')
+    values = identifiers(20)
+    pq.write_table(pa.table({'identifier': values}), path)
+    mapping = str(tmp_path / ('data' + extension))
+    hasher = Hasher(salt, 'keyed', digest_size=16, encoding='raw')
+    stats = Pseudonymiser(salt, path, hasher=hasher, mapping=mapping).run()
+    digests = pq.read_table(stats['output']).column('DIGEST').to_pylist()
+    assert MappingTable.open(mapping).values(digests).tolist() == values
+
+
+@pytest.mark.parametrize('extension', EXTENSIONS)
+def test_appended_rows_are_merged_into_the_mapping(salt, tmp_path, extension):
+    path = tmp_path / 'data.csv'
+    path.write_text('identifier\n' + ''.join('a{}\n'.format(i) for i in range(10)))
+    mapping = str(tmp_path / ('data' + extension))
+    Pseudonymiser(salt, path, incremental=True, mapping=mapping).run()
+    with open(path, 'a') as f:
+        f.write(''.join('b{}\n'.format(i) for i in range(5)) + 'a0\n')
+    stats = Pseudonymiser(salt, path, incremental=True, mapping=mapping).run()
+    assert (stats['incremental'], stats['mapping_rows']) == ('append', 15)
+    digests = pd.read_csv(stats['output'], dtype='str')['DIGEST'].tolist()
+    assert MappingTable.open(mapping).values(digests).tolist() == pd.read_csv(path, dtype='str')['identifier'].tolist()
+
+    stats = Pseudonymiser(salt, path, incremental=True, mapping=mapping).run()
+    assert (stats['incremental'], stats['mapping_rows']) == ('unchanged', 15)
+    assert MappingTable.open(mapping).values(digests).tolist() == pd.read_csv(path, dtype='str')['identifier'].tolist()
+
+    # a mapping removed since is written again in full rather than from the new rows alone
+    os.remove(mapping)
+    with open(path, 'a') as f:
+        f.write('c0\n')
+    stats = Pseudonymiser(salt, path, incremental=True, mapping=mapping).run()
+    assert (stats['incremental'], stats['mapping_rows']) == ('rebuild', 16)
+
+
+@pytest.mark.parametrize('extension', EXTENSIONS)
+def test_large_lookups_use_the_prefix_index(salt, tmp_path, extension):
+    values = np.array(['v{}'.format(i) for i in range(PREFIX_LOOKUPS * 2)], dtype=object)
+    digests = Hasher(salt).fixed_batch(values.tolist())
+    order = np.argsort(digests)
+    path = str(tmp_path / ('data' + extension))
+    write_mapping(path, values[order], digests[order], False, {})
+    table = MappingTable.open(path)
+    query = digests.astype(str).tolist() + ['f' * 64]
+    assert table.values(query).tolist() == values.tolist() + [None]
@@ -0,0 +1,25 @@
+import openpyxl
+import pandas as pd
+import pytest
+from PseudoProbe import probe_xlsx_headers
+
+
+def sheet_of(path, cells):
+    book = openpyxl.Workbook()
+    for reference, value in cells.items():
+        book.active[reference] = value
+    book.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize('cells', [
+    {'A1': 'identifier', 'B1': 'age', 'A2': 'x', 'B2': 1},
+    {'A1': 'identifier', 'C1': 5, 'A2': 'x', 'D2': 1},
+    {'B1': 'identifier', 'B2': 'x'},
+    {'A3': 'identifier', 'B3': 'age', 'A4': 'x', 'B4': 1},
+    {'B2': 'identifier', 'C5': 'x'},
+    {},
+])
+def test_headers_match_read_excel(tmp_path, cells):
+    path = sheet_of(tmp_path / 'data.xlsx', cells)
+    assert probe_xlsx_headers(path) == list(pd.read_excel(path, dtype='str').columns)
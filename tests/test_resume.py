@@ -0,0 +1,67 @@
+import os
+import pytest
+import PseudoFormats
+from PseudoEngine import Pseudonymiser
+from PseudoManifest import checkpoint_path
+
+
+def csv_rows(path, start, stop):
+    with open(path, 'a') as f:
+        for i in range(start, stop):
+            f.write('id{},{}\n'.format(i, i % 90))
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.mark.parametrize('passthrough', [False, True])
+def test_resumed_csv_run_writes_the_same_bytes(salt, tmp_path, monkeypatch, passthrough):
+    monkeypatch.setattr(PseudoFormats, 'CSV_CHUNK_ROWS', 10)
+    monkeypatch.setattr(PseudoFormats, 'ARROW_BLOCK_BYTES', 64)
+    path = tmp_path / 'data.csv'
+    path.write_text('identifier,age\n')
+    csv_rows(path, 0, 100)
+    full = Pseudonymiser(salt, path, output_path=str(tmp_path / 'full.csv'), passthrough=passthrough).run()
+
+    def crash(phase, done, total):
+        if phase == 'pseudonymising' and done >= 40:
+            raise Crash()
+
+    output = str(tmp_path / 'out.csv')
+    with pytest.raises(Crash):
+        Pseudonymiser(salt, path, output_path=output, passthrough=passthrough, progress=crash,
+                      checkpoint_seconds=0).run()
+    assert not os.path.exists(output)
+    assert os.path.exists(checkpoint_path(output))
+
+    stats = Pseudonymiser(salt, path, output_path=output, passthrough=passthrough, resume=True).run()
+    assert 0 < stats['resumed_rows'] < 100
+    assert stats['rows'] == 100
+    assert read_bytes(output) == read_bytes(full['output'])
+    assert not os.path.exists(checkpoint_path(output))
+
+
+def test_resume_starts_over_when_the_input_changed(salt, tmp_path, monkeypatch):
+    monkeypatch.setattr(PseudoFormats, 'CSV_CHUNK_ROWS', 10)
+    path = tmp_path / 'data.csv'
+    path.write_text('identifier,age\n')
+    csv_rows(path, 0, 50)
+
+    def crash(phase, done, total):
+        if phase == 'pseudonymising' and done >= 20:
+            raise Crash()
+
+    output = str(tmp_path / 'out.csv')
+    with pytest.raises(Crash):
+        Pseudonymiser(salt, path, output_path=output, progress=crash, checkpoint_seconds=0).run()
+    csv_rows(path, 50, 60)
+    stats = Pseudonymiser(salt, path, output_path=output, resume=True).run()
+    assert 'resumed_rows' not in stats
+    full = Pseudonymiser(salt, path, output_path=str(tmp_path / 'full.csv')).run()
+    assert read_bytes(output) == read_bytes(full['output'])
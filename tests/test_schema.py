@@ -0,0 +1,34 @@
+import logging
+import pandas as pd
+import pytest
+from PseudoEngine import Pseudonymiser, pseudo
+from PseudoSchema import HeaderSchema, HeaderCollisionError, lower_headers
+
+
+def test_aliases_match_headers_as_normalised():
+    schema = HeaderSchema(aliases={'Patient ID': 'identifier'})
+    assert schema.names([' patient id', 'Age (Years)']) == ['identifier', 'age_years']
+    assert HeaderSchema(lower_headers, {'Patient ID': 'identifier'}).names(['PATIENT ID', 'Age']) == \
+        ['identifier', 'age']
+
+
+def test_collisions_fail_only_for_the_chosen_columns(caplog):
+    schema = HeaderSchema(aliases={'Patient ID': 'identifier'})
+    with pytest.raises(HeaderCollisionError, match="'identifier'"):
+        schema.names(['identifier', 'Patient ID'], ['identifier'])
+    with caplog.at_level(logging.WARNING, logger='PseudoSchema'):
+        assert HeaderSchema().names(['Age', 'age ', 'identifier'], ['identifier']) == ['age', 'age', 'identifier']
+    assert "all become 'age'" in caplog.text
+
+
+def test_runs_pseudonymise_an_aliased_column(salt, tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('Patient ID,Age\na,1\n')
+    stats = Pseudonymiser(salt, path, aliases={'Patient ID': 'identifier'}).run()
+    out = pd.read_csv(stats['output'], dtype='str')
+    assert list(out.columns) == ['age', 'DIGEST']
+    assert out['DIGEST'].tolist() == [pseudo('a', salt)]
+
+    path.write_text('Patient ID,identifier\na,b\n')
+    with pytest.raises(HeaderCollisionError):
+        Pseudonymiser(salt, path, aliases={'Patient ID': 'identifier'}).run()
@@ -0,0 +1,108 @@
+import os
+import json
+import socket
+import threading
+import http.client
+import pytest
+from PseudoService import PseudoService, ForbiddenError, make_server
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    inside, outside = tmp_path / 'inside', tmp_path / 'outside'
+    inside.mkdir()
+    outside.mkdir()
+    for directory in (inside, outside):
+        (directory / 'data.csv').write_text('identifier,age\na,1\nb,2\n')
+    return inside, outside
+
+
+def service(salt, roots=None, output_roots=None):
+    return PseudoService({'test': salt}, workers=1, roots=roots, output_roots=output_roots)
+
+
+def test_files_are_refused_without_roots(salt, dirs):
+    inside, _ = dirs
+    with pytest.raises(ForbiddenError):
+        service(salt).run_file({'path': str(inside / 'data.csv')})
+
+
+def test_files_only_run_below_the_roots(salt, dirs):
+    inside, outside = dirs
+    svc = service(salt, roots=[str(inside)])
+    stats = svc.run_file({'path': str(inside / 'data.csv')})
+    assert stats['rows'] == 2
+    assert os.path.exists(inside / 'data_psuedo.csv')
+    with pytest.raises(ForbiddenError):
+        svc.run_file({'path': str(outside / 'data.csv')})
+    with pytest.raises(ForbiddenError):
+        svc.run_file({'path': str(inside / '..' / 'outside' / 'data.csv')})
+    os.symlink(outside / 'data.csv', inside / 'link.csv')
+    with pytest.raises(ForbiddenError):
+        svc.run_file({'path': str(inside / 'link.csv')})
+
+
+def test_outputs_and_mappings_stay_below_the_output_roots(salt, dirs):
+    inside, outside = dirs
+    svc = service(salt, roots=[str(inside)])
+    for request in ({'output_path': str(outside / 'out.csv')},
+                    {'mapping': str(outside / 'data.mapping.bin')}):
+        with pytest.raises(ForbiddenError):
+            svc.run_file(dict(request, path=str(inside / 'data.csv')))
+    assert os.listdir(outside) == ['data.csv']
+
+    # the default output beside the input is outside the output roots too
+    with pytest.raises(ForbiddenError):
+        service(salt, roots=[str(inside)], output_roots=[str(outside)]).run_file({'path': str(inside / 'data.csv')})
+    svc = service(salt, roots=[str(inside)], output_roots=[str(outside)])
+    svc.run_file({'path': str(inside / 'data.csv'), 'output_path': str(outside / 'out.csv'),
+                  'mapping': str(outside / 'out.mapping.bin')})
+    assert sorted(os.listdir(outside)) == ['data.csv', 'out.csv', 'out.mapping.bin']
+
+
+def test_files_can_name_their_format(salt, dirs):
+    inside, _ = dirs
+    os.rename(inside / 'data.csv', inside / 'data.txt')
+    stats = service(salt, roots=[str(inside)]).run_file({'path': str(inside / 'data.txt'), 'format': 'csv'})
+    assert (stats['format'], stats['rows']) == ('csv', 2)
+
+
+def test_file_requests_outside_the_roots_get_a_403(salt, dirs):
+    inside, outside = dirs
+    server = make_server(service(salt, roots=[str(inside)]), '127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection(*server.server_address[:2])
+        connection.request('POST', '/file', json.dumps({'path': str(outside / 'data.csv')}))
+        response = connection.getresponse()
+        assert response.status == 403
+        assert 'outside' in json.loads(response.read())['error']
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_remote_hosts_need_allow_remote(salt):
+    with pytest.raises(ValueError, match='allow-remote'):
+        make_server(service(salt), '0.0.0.0', 0)
+    for host in ('127.0.0.1', 'localhost'):
+        make_server(service(salt), host, 0).server_close()
+    make_server(service(salt), '0.0.0.0', 0, allow_remote=True).server_close()
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='needs Unix sockets')
+def test_only_a_stale_socket_is_replaced(salt, tmp_path):
+    path = str(tmp_path / 'data.csv')
+    with open(path, 'w') as f:
+        f.write('identifier\na\n')
+    with pytest.raises(ValueError, match='not a socket'):
+        make_server(service(salt), socket_path=path)
+    assert open(path).read() == 'identifier\na\n'
+
+    path = str(tmp_path / 'pseudo.sock')
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(path)
+    stale.close()
+    make_server(service(salt), socket_path=path).server_close()
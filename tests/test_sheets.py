@@ -0,0 +1,62 @@
+import logging
+import pandas as pd
+import pytest
+from PseudoEngine import Pseudonymiser, MissingColumnError, pseudo
+from conftest import write_workbook
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    return write_workbook(tmp_path / 'mixed.xlsx', {
+        'Data': [['identifier', 'age'], ['a1', 30], ['a2', 40]],
+        'Notes': [['note'], ['collected in 2020'], ['see protocol']],
+        'Other': [['Identifier', 'site'], ['b1', 'x']],
+    })
+
+
+def read_sheets(path):
+    return pd.read_excel(path, sheet_name=None, dtype='str')
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_all_sheets_copies_sheets_without_the_column(tmp_path, workbook, salt, streaming, caplog):
+    output = str(tmp_path / 'out.xlsx')
+    with caplog.at_level(logging.WARNING):
+        stats = Pseudonymiser(salt, workbook, output_path=output, sheets='all', streaming=streaming).run()
+    assert stats['sheets'] == {'Data': 2, 'Notes': 2, 'Other': 1}
+    sheets = read_sheets(output)
+    assert list(sheets) == ['Data', 'Notes', 'Other']
+    assert sheets['Data']['DIGEST'].tolist() == [pseudo('a1', salt), pseudo('a2', salt)]
+    assert sheets['Notes']['note'].tolist() == ['collected in 2020', 'see protocol']
+    assert sheets['Other']['DIGEST'].tolist() == [pseudo('b1', salt)]
+    assert "Sheet 'Notes'" in caplog.text
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_sheet_with_no_columns_is_copied(tmp_path, workbook, salt, streaming):
+    output = str(tmp_path / 'out.xlsx')
+    Pseudonymiser(salt, workbook, output_path=output, sheets={'Data': 'identifier', 'Notes': []},
+                  streaming=streaming).run()
+    sheets = read_sheets(output)
+    assert list(sheets) == ['Data', 'Notes']
+    assert list(sheets['Data'].columns) == ['age', 'DIGEST']
+    assert sheets['Notes']['note'].tolist() == ['collected in 2020', 'see protocol']
+
+
+def test_sheets_not_chosen_are_reported(tmp_path, workbook, salt, caplog):
+    output = str(tmp_path / 'out.xlsx')
+    with caplog.at_level(logging.WARNING):
+        Pseudonymiser(salt, workbook, output_path=output, sheets=['Data']).run()
+    assert list(read_sheets(output)) == ['Data']
+    assert "'Notes', 'Other'" in caplog.text
+
+
+def test_named_sheet_must_have_its_columns(tmp_path, workbook, salt):
+    with pytest.raises(MissingColumnError):
+        Pseudonymiser(salt, workbook, output_path=str(tmp_path / 'out.xlsx'), sheets=['Notes']).run()
+
+
+def test_all_sheets_without_the_column_anywhere(tmp_path, salt):
+    path = write_workbook(tmp_path / 'notes.xlsx', {'A': [['note'], ['x']], 'B': [['note'], ['y']]})
+    with pytest.raises(MissingColumnError):
+        Pseudonymiser(salt, path, output_path=str(tmp_path / 'out.xlsx'), sheets='all').run()